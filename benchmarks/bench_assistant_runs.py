@@ -0,0 +1,266 @@
+"""
+Benchmark Assistants run latency in app/original.py against a local mock server.
+
+The mock server implements the handful of Assistants endpoints the app
+uses. Every run "thinks" for --think seconds, asks for one tavily_search
+tool call, thinks again after the outputs are submitted and then writes a
+reply in --chunks pieces --chunk-delay seconds apart. Three ways of
+driving the same run are compared:
+
+    legacy   the previous loop: sleep 1 s, retrieve, repeat
+    backoff  run_polled: polling with adaptive backoff (the fallback path)
+    stream   chat_with_assistant: streamed run events
+
+For each it reports time to the first reply text, time to the full reply
+and HTTP requests per chat. With streaming, latency should track the mock
+server's own think time instead of being rounded up to whole seconds.
+
+Needs the app's dependencies (gradio, openai, tavily) installed; no real
+API calls are made and the search client is replaced by an instant stub.
+
+    python benchmarks/bench_assistant_runs.py --chats 10 --think 0.3
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import warnings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+REPLY = "Ooh, bats are my favourite! They sleep upside down all day, just like my cousin Vlad."
+
+
+class MockAssistants:
+    """In-memory state of the mock server: runs and their phases."""
+
+    def __init__(self, think, chunks, chunk_delay):
+        self.think = think
+        self.chunks = chunks
+        self.chunk_delay = chunk_delay
+        self.requests = 0
+        self.runs = {}
+        self.lock = threading.Lock()
+
+    def run_object(self, run_id, status):
+        run = self.runs[run_id]
+        required_action = None
+        if status == "requires_action":
+            required_action = {
+                "type": "submit_tool_outputs",
+                "submit_tool_outputs": {"tool_calls": [{
+                    "id": "call_" + run_id,
+                    "type": "function",
+                    "function": {"name": "tavily_search", "arguments": json.dumps({"query": "bats"})},
+                }]},
+            }
+        return {
+            "id": run_id, "object": "thread.run", "created_at": 0, "status": status,
+            "thread_id": run["thread_id"], "assistant_id": "asst_mock",
+            "required_action": required_action, "last_error": None,
+            "model": "mock", "instructions": "", "tools": [],
+        }
+
+    def status(self, run_id):
+        run = self.runs[run_id]
+        if time.monotonic() - run["phase_start"] < self.think:
+            return "in_progress"
+        return "requires_action" if run["phase"] == 1 else "completed"
+
+    def message_list(self, thread_id):
+        message = {
+            "id": "msg_" + thread_id, "object": "thread.message", "created_at": 0,
+            "thread_id": thread_id, "role": "assistant", "status": "completed",
+            "content": [{"type": "text", "text": {"value": REPLY, "annotations": []}}],
+        }
+        return {"object": "list", "data": [message], "first_id": message["id"], "last_id": message["id"], "has_more": False}
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _json(self, body):
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _event(self, event, data):
+            self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode())
+            self.wfile.flush()
+
+        def _stream_phase(self, run_id):
+            """Stream one phase of a run until it needs tools or completes."""
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            run = state.runs[run_id]
+            for status in ("queued", "in_progress"):
+                self._event(f"thread.run.{status}", state.run_object(run_id, status))
+            time.sleep(state.think)
+            if run["phase"] == 1:
+                self._event("thread.run.requires_action", state.run_object(run_id, "requires_action"))
+            else:
+                words = REPLY.split(" ")
+                size = -(-len(words) // state.chunks)
+                for i in range(0, len(words), size):
+                    text = " ".join(words[i:i + size]) + (" " if i + size < len(words) else "")
+                    self._event("thread.message.delta", {
+                        "id": "msg_" + run_id, "object": "thread.message.delta",
+                        "delta": {"content": [{"index": 0, "type": "text", "text": {"value": text}}]},
+                    })
+                    time.sleep(state.chunk_delay)
+                self._event("thread.run.completed", state.run_object(run_id, "completed"))
+            self.wfile.write(b"event: done\ndata: [DONE]\n\n")
+
+        def do_GET(self):
+            with state.lock:
+                state.requests += 1
+            if re.fullmatch(r"/v1/assistants(\?.*)?", self.path):
+                return self._json({"object": "list", "data": [], "has_more": False})
+            if m := re.fullmatch(r"/v1/threads/([^/]+)/runs/([^/]+)", self.path):
+                return self._json(state.run_object(m.group(2), state.status(m.group(2))))
+            if m := re.fullmatch(r"/v1/threads/([^/?]+)/messages(\?.*)?", self.path):
+                return self._json(state.message_list(m.group(1)))
+            self.send_error(404)
+
+        def do_POST(self):
+            with state.lock:
+                state.requests += 1
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            if self.path == "/v1/assistants":
+                return self._json({"id": "asst_mock", "object": "assistant", "created_at": 0, "model": "mock", "tools": []})
+            if self.path == "/v1/threads":
+                return self._json({"id": "thread_" + uuid.uuid4().hex[:8], "object": "thread", "created_at": 0})
+            if m := re.fullmatch(r"/v1/threads/([^/]+)/messages", self.path):
+                return self._json({"id": "msg_" + uuid.uuid4().hex[:8], "object": "thread.message",
+                                   "thread_id": m.group(1), "role": "user", "content": []})
+            if m := re.fullmatch(r"/v1/threads/([^/]+)/runs", self.path):
+                run_id = "run_" + uuid.uuid4().hex[:8]
+                state.runs[run_id] = {"thread_id": m.group(1), "phase": 1, "phase_start": time.monotonic()}
+                if body.get("stream"):
+                    return self._stream_phase(run_id)
+                return self._json(state.run_object(run_id, "queued"))
+            if m := re.fullmatch(r"/v1/threads/([^/]+)/runs/([^/]+)/submit_tool_outputs", self.path):
+                run_id = m.group(2)
+                state.runs[run_id].update(phase=2, phase_start=time.monotonic())
+                if body.get("stream"):
+                    return self._stream_phase(run_id)
+                return self._json(state.run_object(run_id, "in_progress"))
+            self.send_error(404)
+
+    return Handler
+
+
+class StubSearchClient:
+    """Instant stand-in for TavilyClient."""
+
+    def get_search_context(self, query, **kwargs):
+        return f"Search results for {query} ({uuid.uuid4().hex[:8]})"
+
+
+def legacy_chat(original, message):
+    """The pre-streaming request path: fixed one-second polling."""
+    client, thread_id = original.client, original.session_threads.get("default")
+
+    def wait(run_id):
+        while True:
+            time.sleep(1)
+            run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
+            if run.status in ['completed', 'failed', 'requires_action']:
+                return run
+
+    client.beta.threads.messages.create(thread_id=thread_id, role="user", content=message)
+    run = client.beta.threads.runs.create(thread_id=thread_id, assistant_id=original.assistant_registry.get())
+    run = wait(run.id)
+    if run.status == 'requires_action':
+        run = original.submit_tool_outputs(thread_id, run.id, run.required_action.submit_tool_outputs.tool_calls)
+        run = wait(run.id)
+    for msg in client.beta.threads.messages.list(thread_id=thread_id):
+        if msg.role == "assistant":
+            yield msg.content[0].text.value
+            return
+
+
+def backoff_chat(original, message):
+    thread_id = original.session_threads.get("default")
+    original.client.beta.threads.messages.create(thread_id=thread_id, role="user", content=message)
+    yield original.run_polled(thread_id, original.assistant_registry.get())
+
+
+def measure(chat, original, state, chats):
+    first, total, requests = [], [], []
+    for _ in range(chats):
+        before = state.requests
+        start = time.perf_counter()
+        first_text = None
+        reply = ""
+        for reply in chat(original, "Tell me about bats"):
+            if first_text is None and reply:
+                first_text = time.perf_counter() - start
+        total.append(time.perf_counter() - start)
+        first.append(first_text if first_text is not None else total[-1])
+        requests.append(state.requests - before)
+        assert reply.strip() == REPLY, reply
+    return first, total, requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=5)
+    parser.add_argument("--think", type=float, default=0.3, help="server-side seconds per run phase")
+    parser.add_argument("--chunks", type=int, default=8)
+    parser.add_argument("--chunk-delay", type=float, default=0.02)
+    parser.add_argument("--modes", nargs="+", default=["legacy", "backoff", "stream"])
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", category=DeprecationWarning)
+    state = MockAssistants(args.think, args.chunks, args.chunk_delay)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    os.environ.update(
+        OPENAI_API_KEY="mock",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{server.server_address[1]}/v1",
+        TAVILY_API_KEY="mock",
+    )
+    # original.py writes its avatar files to the working directory on import
+    os.chdir(tempfile.mkdtemp())
+    from vampire_chat.app import original
+    original.tavily_client = StubSearchClient()
+    print(f"API requests made while importing original.py: {state.requests}")
+    # Resolve the assistant and the session's thread before timing anything
+    original.assistant_registry.get()
+    original.session_threads.get("default")
+
+    chats = {
+        "legacy": legacy_chat,
+        "backoff": backoff_chat,
+        "stream": lambda module, message: module.chat_with_assistant(message, []),
+    }
+    ideal = 2 * args.think + args.chunks * args.chunk_delay
+    print(f"{args.chats} chats per mode, server work per chat ~{ideal:.2f} s (2 phases + streamed reply)\n")
+    print(f"{'mode':<8} {'first text p50':>15} {'reply p50':>10} {'reply p95':>10} {'requests':>9}")
+    for mode in args.modes:
+        first, total, requests = measure(chats[mode], original, state, args.chats)
+        total_sorted = sorted(total)
+        p95 = total_sorted[min(len(total_sorted) - 1, int(0.95 * len(total_sorted)))]
+        print(f"{mode:<8} {statistics.median(first):>14.3f}s {statistics.median(total):>9.3f}s "
+              f"{p95:>9.3f}s {statistics.mean(requests):>9.1f}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark concurrent message writes through DatabaseManager.
+
+Compares the pooled WAL connection layer against the previous behaviour of
+opening a fresh rollback-journal connection for every call, at 1, 8 and 32
+concurrent writer threads.
+
+    python benchmarks/bench_db_writers.py --messages 2000
+"""
+import argparse
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from vampire_chat.database.db_manager import DatabaseManager
+
+
+def legacy_add_message(db_path, conversation_id, role, content, message_id):
+    """The pre-pool write path: one connection per call, default journal."""
+    with sqlite3.connect(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """INSERT INTO messages (message_id, conversation_id, role, content)
+               VALUES (?, ?, ?, ?)""",
+            (message_id, conversation_id, role, content)
+        )
+        cursor.execute(
+            """UPDATE conversations
+               SET last_updated = CURRENT_TIMESTAMP
+               WHERE conversation_id = ?""",
+            (conversation_id,)
+        )
+        conn.commit()
+
+
+def run(mode, writers, total_messages, workdir):
+    db_path = str(Path(workdir) / f"{mode}_{writers}.db")
+    manager = DatabaseManager(db_path)
+    if mode == "legacy":
+        # Undo the WAL switch the pool made so the baseline is faithful
+        manager.close()
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("PRAGMA journal_mode=DELETE")
+        add = lambda *args: legacy_add_message(db_path, *args)
+    else:
+        add = manager.add_message
+
+    per_writer = total_messages // writers
+    conversations = [str(uuid.uuid4()) for _ in range(writers)]
+    for conversation_id in conversations:
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("INSERT INTO conversations (conversation_id) VALUES (?)", (conversation_id,))
+
+    barrier = threading.Barrier(writers + 1)
+
+    def writer(conversation_id):
+        barrier.wait()
+        for i in range(per_writer):
+            add(conversation_id, "user", f"message {i} from a benchmark writer", str(uuid.uuid4()))
+
+    threads = [threading.Thread(target=writer, args=(cid,)) for cid in conversations]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    manager.close()
+    return per_writer * writers / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000, help="messages written per run")
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f"{'writers':>8} {'legacy msg/s':>14} {'pooled msg/s':>14} {'speedup':>8}")
+        for writers in args.writers:
+            legacy = run("legacy", writers, args.messages, workdir)
+            pooled = run("pooled", writers, args.messages, workdir)
+            print(f"{writers:>8} {legacy:>14.0f} {pooled:>14.0f} {pooled / legacy:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,429 @@
+"""
+End-to-end benchmark and load test of the chat request path.
+
+A local stand-in for the OpenAI chat completions API (streaming and not,
+with configurable time to first token and per-token delay) replaces the
+real service, so the whole of ``chat_with_lilly`` runs for real: the
+write-behind queue, SQLite, the embedding encoder, FAISS and BM25
+retrieval, prompt assembly and the streamed LLM reply.
+
+For every corpus size a fresh working directory is filled with a synthetic
+history of that many messages, split into conversations, and then
+--sessions concurrent sessions each chat --turns times. Every session's
+user owns a few of the corpus conversations, so its retrieval searches real
+history.
+Each size runs in its own subprocess, so the stores start cold and the
+resident memory of each size can be compared.
+
+Reported per size: throughput (turns per second over all sessions), the
+latency percentiles of every stage the app records (db_write, embedding,
+faiss_search, retrieval, prompt_assembly, llm_first_token, llm_total, ...)
+plus whole turns, and a second pass of direct store queries against the
+full corpus (unscoped vector search, full-text search). Results are
+written as JSON; with --baseline, p95 latencies and throughput are compared
+with an earlier run and the exit status is 1 on a regression.
+
+Loading a large corpus with the real embedding model takes long, so
+--embedder hash swaps in a deterministic hashed bag-of-words embedder with
+the same dimensionality; every other component is unchanged.
+
+    python benchmarks/bench_e2e.py --sizes 1000 10000 --sessions 8 --turns 5
+    python benchmarks/bench_e2e.py --sizes 1000000 --embedder hash --output e2e.json
+    python benchmarks/bench_e2e.py --baseline e2e.json --tolerance 0.25
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+SYLLABLES = ["ba", "ka", "lo", "mi", "nu", "ra", "shi", "to", "ve", "zu", "gri", "mor", "sel", "dra", "pin"]
+TOPICS = ["bats", "moonlight", "castle", "garlic", "coffin", "night", "school", "friends", "cats", "stars",
+          "pumpkins", "ghosts", "cookies", "dragons", "homework", "birthday", "forest", "owls", "rain", "games"]
+
+
+class FakeOpenAI:
+    """Counters and timing of the local chat completions stand-in."""
+
+    def __init__(self, first_token, token_delay, tokens):
+        self.first_token = first_token
+        self.token_delay = token_delay
+        self.tokens = tokens
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def words(self):
+        return [f"{TOPICS[i % len(TOPICS)]}{'' if i + 1 == self.tokens else ' '}" for i in range(self.tokens)]
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _chunk(self, payload):
+            data = f"data: {payload}\n\n".encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            if self.path != "/v1/chat/completions":
+                self.send_error(404)
+                return
+            with state.lock:
+                state.requests += 1
+            base = {"id": "chatcmpl-" + uuid.uuid4().hex[:12], "created": int(time.time()), "model": body.get("model", "fake")}
+            time.sleep(state.first_token)
+
+            if not body.get("stream"):
+                data = json.dumps({**base, "object": "chat.completion", "choices": [{
+                    "index": 0, "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": "".join(state.words())},
+                }], "usage": {"prompt_tokens": 0, "completion_tokens": state.tokens, "total_tokens": state.tokens}}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i, word in enumerate(state.words()):
+                if i:
+                    time.sleep(state.token_delay)
+                self._chunk(json.dumps({**base, "object": "chat.completion.chunk", "choices": [
+                    {"index": 0, "delta": {"content": word}, "finish_reason": None}]}))
+            self._chunk(json.dumps({**base, "object": "chat.completion.chunk", "choices": [
+                {"index": 0, "delta": {}, "finish_reason": "stop"}]}))
+            self._chunk("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+
+    return Handler
+
+
+class HashEmbedder:
+    """Deterministic hashed bag-of-words stand-in for a SentenceTransformer."""
+
+    def __init__(self, dim):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, **kwargs):
+        vectors = np.zeros((len(texts), self.dim), dtype="float32")
+        for row, text in enumerate(texts):
+            buckets = [zlib.crc32(word.encode()) % self.dim for word in text.lower().split()]
+            np.add.at(vectors[row], buckets, 1.0)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+
+class Corpus:
+    """Synthetic chat text: topic words plus a Zipf-distributed vocabulary."""
+
+    def __init__(self, vocabulary=5000, seed=0):
+        rng = np.random.default_rng(seed)
+        parts = rng.integers(0, len(SYLLABLES), (vocabulary, 3))
+        self.words = np.array(TOPICS + ["".join(SYLLABLES[p] for p in row) for row in parts])
+        self.rng = rng
+
+    def sentences(self, count):
+        lengths = self.rng.integers(6, 20, count)
+        ranks = np.minimum(self.rng.zipf(1.3, lengths.sum()) - 1, len(self.words) - 1)
+        words = self.words[ranks]
+        bounds = np.concatenate([[0], np.cumsum(lengths)])
+        return [" ".join(words[bounds[i]:bounds[i + 1]]) for i in range(count)]
+
+
+def rss_mib():
+    """Current resident set size of this process (Linux)."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def load_corpus(resources, corpus, size, conversation_length, batch_size, owner):
+    """Write ``size`` messages straight to SQLite and the vector store.
+
+    ``owner(n)`` names the user of the n-th conversation, or None.
+    """
+    conversation_ids = []
+    user_ids = {}
+    for start in range(0, size, batch_size):
+        count = min(batch_size, size - start)
+        batch = []
+        for i, content in enumerate(corpus.sentences(count), start):
+            if i % conversation_length == 0:
+                conversation_id = str(uuid.uuid4())
+                user_ids[conversation_id] = owner(len(conversation_ids))
+                conversation_ids.append(conversation_id)
+            batch.append({
+                "message_id": str(uuid.uuid4()),
+                "conversation_id": conversation_ids[-1],
+                "role": "user" if i % 2 == 0 else "assistant",
+                "content": content,
+            })
+        resources.db_manager.add_messages(batch, dict.fromkeys(msg["conversation_id"] for msg in batch), user_ids)
+        resources.vector_store.add_messages(batch)
+    # A promotion to a larger index kind may still be building
+    rebuild = resources.vector_store._rebuild_thread
+    if rebuild is not None:
+        rebuild.join()
+    return conversation_ids
+
+
+class Request:
+    """The part of gr.Request the chat handler uses."""
+
+    def __init__(self, session_hash):
+        self.session_hash = session_hash
+
+
+async def run_session(main, request, user_id, messages, turns):
+    history = []
+    for message in messages[:turns]:
+        start = time.perf_counter()
+        first = None
+        async for update in main.chat_with_lilly(message, list(history), user_id, request=request):
+            if first is None and update and update[-1]["role"] == "assistant" and update[-1]["content"]:
+                first = time.perf_counter() - start
+            history = update
+        total = time.perf_counter() - start
+        main.latency.record("turn_first_update", first if first is not None else total)
+        main.latency.record("turn_total", total)
+
+
+def worker(args):
+    """Subprocess entry point: build one corpus size, load-test it, write JSON."""
+    os.chdir(args.workdir)
+    Path("vampire_chat/database").mkdir(parents=True, exist_ok=True)
+
+    from vampire_chat.app import main
+    from vampire_chat.config.settings import EMBEDDING_BACKEND, EMBEDDING_MODEL
+    from vampire_chat.database import encoder
+
+    if args.embedder == "hash":
+        encoder._models[(EMBEDDING_MODEL, EMBEDDING_BACKEND)] = HashEmbedder(args.dim)
+
+    start = time.perf_counter()
+    main.startup.start(*main.CHAT_PHASES)
+    for name in main.CHAT_PHASES:
+        main.startup.get(name)
+    sessions = main.startup.get("sessions")
+    resources = sessions.resources
+    startup_seconds = time.perf_counter() - start
+
+    corpus = Corpus(seed=args.size)
+    rss_before = rss_mib()
+    start = time.perf_counter()
+    # The first --owned rounds of conversations are dealt out to the sessions' users
+    def owner(n):
+        return f"bench-user-{n % args.sessions}" if n // args.sessions < args.owned else None
+
+    load_corpus(resources, corpus, args.size, args.conversation_length, args.batch_size, owner)
+    load_seconds = time.perf_counter() - start
+    main.latency.reset()
+
+    # Every session's user owns a few corpus conversations, and the session
+    # starts a new one
+    requests = []
+    for s in range(args.sessions):
+        request = Request(f"bench-session-{s}")
+        manager = sessions.get(request.session_hash)
+        manager.set_user(f"bench-user-{s}")
+        manager.start_new_conversation()
+        requests.append(request)
+
+    async def load_test():
+        await asyncio.gather(*(
+            run_session(main, request, f"bench-user-{s}", corpus.sentences(args.turns), args.turns)
+            for s, request in enumerate(requests)
+        ))
+
+    start = time.perf_counter()
+    asyncio.run(load_test())
+    wall = time.perf_counter() - start
+    resources.write_queue.flush()
+    chat_stages = main.latency.summary()
+    main.latency.reset()
+
+    # Direct queries against the whole corpus rather than one session's history
+    for query in corpus.sentences(args.queries):
+        with main.latency.measure("vector_search_unscoped"):
+            resources.vector_store.search_similar_messages(query, k=10)
+        with main.latency.measure("fts_search"):
+            resources.db_manager.search_messages(query, limit=10)
+    store_stages = main.latency.summary()
+    for stage in ("embedding", "faiss_search"):
+        store_stages.pop(stage, None)
+
+    turns = args.sessions * args.turns
+    Path(args.out).write_text(json.dumps({
+        "corpus_size": args.size,
+        "sessions": args.sessions,
+        "turns": turns,
+        "wall_seconds": wall,
+        "throughput_turns_per_s": turns / wall,
+        "startup_seconds": startup_seconds,
+        "load_seconds": load_seconds,
+        "load_messages_per_s": args.size / load_seconds if load_seconds else 0.0,
+        "corpus_rss_mib": rss_mib() - rss_before,
+        "index_kind": type(resources.vector_store.index).__name__,
+        "stages": {**chat_stages, **store_stages},
+    }))
+
+
+def run_size(size, args, base_url):
+    with tempfile.TemporaryDirectory() as workdir:
+        out = str(Path(workdir) / "result.json")
+        env = dict(os.environ, OPENAI_API_KEY="bench", OPENAI_BASE_URL=base_url, TAVILY_API_KEY="bench")
+        result = subprocess.run(
+            [sys.executable, __file__, "--worker", "--size", str(size), "--workdir", workdir, "--out", out,
+             "--sessions", str(args.sessions), "--turns", str(args.turns), "--owned", str(args.owned),
+             "--queries", str(args.queries), "--conversation-length", str(args.conversation_length),
+             "--batch-size", str(args.batch_size), "--embedder", args.embedder, "--dim", str(args.dim)],
+            env=env, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            print(f"corpus {size}: failed\n{result.stderr.strip()}")
+            return None
+        return json.loads(Path(out).read_text())
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=Path(__file__).resolve().parent,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def regressions(runs, baseline, tolerance, floor):
+    """Stages whose p95 grew, or throughput that fell, by more than ``tolerance``."""
+    previous = {(run["corpus_size"], run["sessions"]): run for run in baseline["runs"]}
+    found = []
+    for run in runs:
+        old = previous.get((run["corpus_size"], run["sessions"]))
+        if old is None:
+            continue
+        label = f"corpus {run['corpus_size']}, {run['sessions']} sessions"
+        if run["throughput_turns_per_s"] < old["throughput_turns_per_s"] * (1 - tolerance):
+            found.append(f"{label}: throughput {old['throughput_turns_per_s']:.2f} -> {run['throughput_turns_per_s']:.2f} turns/s")
+        for stage, stats in run["stages"].items():
+            before = old["stages"].get(stage, {}).get("p95")
+            after = stats.get("p95")
+            if before is None or after is None:
+                continue
+            if after > before * (1 + tolerance) and after - before > floor:
+                found.append(f"{label}: {stage} p95 {1000 * before:.2f} -> {1000 * after:.2f} ms")
+    return found
+
+
+def print_run(run):
+    print(f"\ncorpus {run['corpus_size']:,} messages ({run['index_kind']}), loaded in {run['load_seconds']:.1f} s "
+          f"({run['load_messages_per_s']:,.0f} msg/s, +{run['corpus_rss_mib']:.0f} MiB)")
+    print(f"{run['sessions']} sessions x {run['turns'] // run['sessions']} turns: "
+          f"{run['throughput_turns_per_s']:.2f} turns/s")
+    print(f"  {'stage':<24} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage, stats in sorted(run["stages"].items()):
+        if stats.get("count"):
+            print(f"  {stage:<24} {stats['count']:>7} {1000 * stats['p50']:>9.2f} "
+                  f"{1000 * stats['p95']:>9.2f} {1000 * stats['p99']:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 100000])
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent chat sessions")
+    parser.add_argument("--turns", type=int, default=5, help="chat turns per session")
+    parser.add_argument("--owned", type=int, default=5, help="corpus conversations owned by each session's user")
+    parser.add_argument("--queries", type=int, default=200, help="direct store queries after the chats")
+    parser.add_argument("--conversation-length", type=int, default=40)
+    parser.add_argument("--batch-size", type=int, default=5000, help="messages per corpus load batch")
+    parser.add_argument("--embedder", choices=["model", "hash"], default="model")
+    parser.add_argument("--dim", type=int, default=384, help="dimensionality of the hash embedder")
+    parser.add_argument("--first-token", type=float, default=0.3, help="fake LLM seconds to first token")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="fake LLM seconds between tokens")
+    parser.add_argument("--tokens", type=int, default=40, help="tokens per fake LLM reply")
+    parser.add_argument("--output", default="bench_e2e.json")
+    parser.add_argument("--baseline", help="earlier --output file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    parser.add_argument("--floor-ms", type=float, default=1.0, help="ignore p95 changes smaller than this")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+
+    state = FakeOpenAI(args.first_token, args.token_delay, args.tokens)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    ideal = args.first_token + (args.tokens - 1) * args.token_delay
+    print(f"Fake LLM: {args.first_token:.3f} s to first token, ~{ideal:.3f} s per reply")
+    runs = []
+    for size in args.sizes:
+        run = run_size(size, args, base_url)
+        if run is not None:
+            print_run(run)
+            runs.append(run)
+    server.shutdown()
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_commit": git_commit(),
+            "python": sys.version.split()[0],
+            "llm_requests": state.requests,
+            "args": {key: value for key, value in vars(args).items() if key not in ("worker", "size", "workdir", "out")},
+        },
+        "runs": runs,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2))
+    print(f"\nResults written to {args.output}")
+
+    failed = len(runs) < len(args.sizes)
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        for key in ("turns", "embedder", "first_token", "token_delay", "tokens"):
+            if baseline["meta"]["args"].get(key) != getattr(args, key):
+                print(f"Note: --{key.replace('_', '-')} differs from the baseline run, timings may not be comparable")
+        found = regressions(runs, baseline, args.tolerance, args.floor_ms / 1000)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if not found:
+            print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+        failed = failed or bool(found)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Measure how long a child waits for their words after they stop recording.
+
+Plays a recording into the app's speech pipeline at real-time pace, in
+--chunk second pieces like Gradio's streaming microphone, then "stops
+recording" --trailing seconds after the speech ends (children rarely hit
+stop the instant they finish). Two paths are timed from the stop:
+
+    batch      the previous flow: convert the whole recording, then transcribe
+    streaming  StreamingTranscriber: VAD-cut utterances transcribed while recording
+
+    python benchmarks/bench_speech.py --wav question.wav
+    VAMPIRE_STT_BACKEND=vosk VAMPIRE_STT_VOSK_MODEL=models/vosk-en python benchmarks/bench_speech.py --wav q.wav
+
+Any WAV works (8/16/32-bit, mono or stereo, any rate); the conversion to
+16 kHz mono float32 is part of what is measured. Without --wav a synthetic
+tone burst is used, which exercises VAD and conversion but transcribes to
+nothing meaningful.
+"""
+import argparse
+import sys
+import time
+import wave
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from vampire_chat.utils.speech import StreamingTranscriber, create_speech_engine, to_mono_float32
+
+
+def read_wav(path):
+    with wave.open(path, "rb") as f:
+        rate, channels, width = f.getframerate(), f.getnchannels(), f.getsampwidth()
+        data = f.readframes(f.getnframes())
+    dtype = {1: np.uint8, 2: np.int16, 4: np.int32}[width]
+    return rate, np.frombuffer(data, dtype=dtype).reshape(-1, channels)
+
+
+def synthetic(rate=48_000, seconds=2.0):
+    t = np.arange(int(rate * seconds)) / rate
+    voice = 0.3 * np.sin(2 * np.pi * 220 * t) * (1 + 0.5 * np.sin(2 * np.pi * 3 * t))
+    samples = np.concatenate([np.zeros(rate // 2), voice]) * 32767
+    samples += np.random.default_rng(0).normal(0, 30, len(samples))
+    return rate, np.stack([samples, samples], axis=1).astype(np.int16)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--wav", help="recording to play (defaults to a synthetic one)")
+    parser.add_argument("--chunk", type=float, default=0.25, help="seconds of audio per streamed chunk")
+    parser.add_argument("--trailing", type=float, default=1.0, help="silence before stop is pressed, seconds")
+    parser.add_argument("--backend", help="speech backend, defaults to STT_BACKEND")
+    args = parser.parse_args()
+
+    rate, samples = read_wav(args.wav) if args.wav else synthetic()
+    silence = np.zeros((int(rate * args.trailing),) + samples.shape[1:], dtype=samples.dtype)
+    if samples.dtype == np.uint8:
+        silence += 128
+    recording = np.concatenate([samples, silence])
+
+    start = time.perf_counter()
+    engine = create_speech_engine(args.backend) if args.backend else create_speech_engine()
+    print(f"{type(engine).__name__} loaded in {time.perf_counter() - start:.2f}s; "
+          f"recording {len(recording) / rate:.1f}s at {rate} Hz x {recording.shape[1]} channel(s)\n")
+    engine.transcribe(to_mono_float32(samples[: rate // 2], rate))  # warm-up
+
+    start = time.perf_counter()
+    text = engine.transcribe(to_mono_float32(recording, rate))
+    print(f"batch      {time.perf_counter() - start:6.3f}s after stop: {text!r}")
+
+    transcriber = StreamingTranscriber(engine.transcribe)
+    step = int(rate * args.chunk)
+    begin = time.perf_counter()
+    for i in range(0, len(recording), step):
+        # Chunks arrive in real time, as they would from the microphone
+        time.sleep(max(0.0, begin + (i + step) / rate - time.perf_counter()))
+        transcriber.feed(rate, recording[i:i + step])
+    start = time.perf_counter()
+    text = transcriber.finish()
+    print(f"streaming  {time.perf_counter() - start:6.3f}s after stop: {text!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark tool execution for Assistants runs against a stubbed search client.
+
+Simulates --sessions chats arriving at once, each run asking for --calls
+searches drawn from a small pool of popular questions (written with varying
+case and punctuation, as kids would type them). The stub client sleeps
+--latency seconds per search and counts how often it is actually called.
+
+    sequential  the previous behaviour: each call in turn, no cache
+    executor    CachedToolExecutor: concurrent calls, normalized-query cache
+                and de-duplication of identical searches in flight
+
+    python benchmarks/bench_tool_executor.py --sessions 16 --calls 3 --latency 0.5
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from vampire_chat.utils.tool_executor import CachedToolExecutor
+
+QUESTIONS = [
+    "do bats really drink blood", "how far away is the moon", "are there vampires in romania",
+    "what do owls eat", "why is the sky dark at night", "how big is a pumpkin",
+]
+
+
+class StubSearchClient:
+    """Slow, call-counting stand-in for TavilyClient."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get_search_context(self, query, **kwargs):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        return f"Search results for {query}"
+
+
+def tool_calls_for(rng, count):
+    calls = []
+    for i in range(count):
+        question = rng.choice(QUESTIONS)
+        question = rng.choice([question, question.capitalize(), question + "?", "  " + question.upper()])
+        calls.append(SimpleNamespace(
+            id=f"call_{i}",
+            function=SimpleNamespace(name="tavily_search", arguments=json.dumps({"query": question})),
+        ))
+    return calls
+
+
+def sequential(client, tool_calls):
+    return [
+        {"tool_call_id": call.id,
+         "output": client.get_search_context(json.loads(call.function.arguments)["query"])}
+        for call in tool_calls
+    ]
+
+
+def run(mode, args):
+    client = StubSearchClient(args.latency)
+    executor = CachedToolExecutor({"tavily_search": lambda query: client.get_search_context(query)})
+    rng = random.Random(0)
+    runs = [tool_calls_for(rng, args.calls) for _ in range(args.sessions)]
+    execute = (lambda calls: sequential(client, calls)) if mode == "sequential" else executor.run
+
+    latencies = []
+
+    def session(calls):
+        start = time.perf_counter()
+        outputs = execute(calls)
+        latencies.append(time.perf_counter() - start)
+        assert [output["tool_call_id"] for output in outputs] == [call.id for call in calls]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        list(pool.map(session, runs))
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return wall, latencies[len(latencies) // 2], latencies[-1], client.calls, executor.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=16)
+    parser.add_argument("--calls", type=int, default=3, help="tool calls per run")
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per search")
+    args = parser.parse_args()
+
+    total = args.sessions * args.calls
+    print(f"{args.sessions} concurrent runs x {args.calls} tool calls, {args.latency:.2f} s per search\n")
+    print(f"{'mode':<11} {'wall s':>7} {'run p50':>8} {'run max':>8} {'searches':>9}")
+    for mode in ("sequential", "executor"):
+        wall, p50, worst, searches, stats = run(mode, args)
+        print(f"{mode:<11} {wall:>7.2f} {p50:>8.2f} {worst:>8.2f} {searches:>5}/{total}")
+    print(f"\nexecutor cache: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Measure memory and recall of the compact vector index layouts.
+
+Builds every layout from the same set of unit-length vectors and compares
+its top-k against exact (flat) search, with and without re-ranking the
+shortlist against the raw float32 vectors the way VectorStore does. Index
+size is the serialized size, which is what the index occupies in memory.
+
+By default the vectors are synthetic: clustered points on the unit sphere
+with the dimensionality of the embedding model. Pass --corpus (one text
+per line) to embed real messages with the configured encoder instead.
+
+    python benchmarks/bench_vector_recall.py --vectors 200000
+    python benchmarks/bench_vector_recall.py --kinds flat fp16 sq8 --rerank 1 4 10
+    python benchmarks/bench_vector_recall.py --corpus messages.txt
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from vampire_chat.database.index_backends import (
+    INDEX_KINDS,
+    LOSSY_KINDS,
+    build_index,
+    set_search_params,
+    train_index,
+)
+
+
+def synthetic_vectors(count, dim, clusters, seed=0):
+    """Unit vectors scattered around random centres, like topical embeddings."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype("float32")
+    vectors = centres[rng.integers(0, clusters, count)] + 0.6 * rng.standard_normal((count, dim)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def corpus_vectors(path):
+    from vampire_chat.database.encoder import EmbeddingEncoder
+
+    texts = [line for line in Path(path).read_text(encoding="utf-8").splitlines() if line.strip()]
+    encoder = EmbeddingEncoder()
+    return np.vstack([encoder.encode(texts[i:i + 256]) for i in range(0, len(texts), 256)]).astype("float32")
+
+
+def rerank(vectors, queries, shortlist, k):
+    """Exact L2 re-ranking of each query's shortlist, as in VectorStore."""
+    result = np.full((len(queries), k), -1, dtype="int64")
+    for i, (query, rows) in enumerate(zip(queries, shortlist)):
+        rows = np.sort(rows[rows != -1])
+        distances = ((vectors[rows] - query) ** 2).sum(axis=1)
+        top = rows[np.argsort(distances)[:k]]
+        result[i, :len(top)] = top
+    return result
+
+
+def recall(found, truth):
+    k = truth.shape[1]
+    return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--kinds", nargs="+", default=["flat", "fp16", "sq8", "ivf_pq"], choices=INDEX_KINDS)
+    parser.add_argument("--rerank", nargs="+", type=int, default=[0, 4], help="shortlist factors to try")
+    parser.add_argument("--corpus", help="text file to embed instead of synthetic vectors")
+    args = parser.parse_args()
+
+    vectors = corpus_vectors(args.corpus) if args.corpus else synthetic_vectors(args.vectors, args.dim, args.clusters)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype("float32")
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+    flat_bytes = len(faiss.serialize_index(exact))
+
+    print(f"{len(vectors)} vectors of dim {vectors.shape[1]}, {len(queries)} queries, recall@{args.k}\n")
+    print(f"{'kind':<9} {'rerank':>6} {'index MiB':>10} {'vs flat':>8} {'recall':>7} {'ms/query':>9}")
+    for kind in args.kinds:
+        index = build_index(kind, vectors.shape[1], len(vectors))
+        train_index(index, vectors)
+        index.add(vectors)
+        set_search_params(index, nprobe=16, ef_search=64)
+        size = len(faiss.serialize_index(index))
+
+        for factor in args.rerank if kind in LOSSY_KINDS else [0]:
+            fetch = args.k * factor if factor else args.k
+            start = time.perf_counter()
+            _, found = index.search(queries, fetch)
+            if factor:
+                found = rerank(vectors, queries, found, args.k)
+            elapsed = time.perf_counter() - start
+            print(f"{kind:<9} {factor or '-':>6} {size / 2**20:>10.1f} {flat_bytes / size:>7.1f}x "
+                  f"{recall(found, truth):>7.3f} {1000 * elapsed / len(queries):>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Compare embedding backends against the torch reference.
+
+Each backend is loaded in its own subprocess so its resident memory can be
+measured in isolation. The report shows, per backend: model load time, RSS
+added by loading the model, single-text and batched encode latency, and
+parity with torch -- the cosine similarity between the two embeddings of
+every sample text (mean and worst case) and how many of each text's top-10
+nearest neighbours over the corpus are the same.
+
+Vectors from a backend are interchangeable with the existing index when the
+worst-case cosine stays close to 1 (>= 0.99) and neighbour overlap is high.
+
+    python benchmarks/embedding_parity.py
+    python benchmarks/embedding_parity.py --backends torch onnx_int8 --threads 4
+    python benchmarks/embedding_parity.py --corpus my_messages.txt   # one text per line
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+SUBJECTS = ["bats", "the moon", "garlic bread", "my cat", "school", "the castle", "a thunderstorm", "pumpkins"]
+TEMPLATES = [
+    "Do you like {}?",
+    "Tell me a story about {}.",
+    "I saw {} yesterday and it was amazing!",
+    "What is your favourite thing about {}?",
+    "My friend says {} are scary, is that true?",
+    "Can vampires eat {}?",
+]
+
+
+def sample_corpus():
+    return [template.format(subject) for subject in SUBJECTS for template in TEMPLATES]
+
+
+def rss_kib():
+    """Current resident set size of this process, in KiB (Linux)."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def worker(args):
+    """Subprocess entry point: load one backend, encode, report JSON."""
+    import os
+
+    os.environ["VAMPIRE_EMBEDDING_THREADS"] = str(args.threads)
+    from vampire_chat.database.encoder import get_model
+
+    texts = Path(args.texts).read_text(encoding="utf-8").splitlines()
+    before = rss_kib()
+    start = time.perf_counter()
+    model = get_model(args.model, args.worker)
+    load_seconds = time.perf_counter() - start
+    model.encode(texts[:8])  # warm-up
+
+    single = []
+    for text in texts[: args.single]:
+        start = time.perf_counter()
+        model.encode([text])
+        single.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    embeddings = np.asarray(model.encode(texts, batch_size=32), dtype="float32")
+    batch_seconds = time.perf_counter() - start
+
+    np.save(args.out, embeddings)
+    print(json.dumps({
+        "load_seconds": load_seconds,
+        "rss_mib": (rss_kib() - before) / 1024,
+        "single_ms_p50": 1000 * float(np.median(single)),
+        "batch_texts_per_s": len(texts) / batch_seconds,
+        "dim": int(embeddings.shape[1]),
+    }))
+
+
+def run_backend(backend, args, texts_path, workdir):
+    out = str(Path(workdir) / f"{backend}.npy")
+    result = subprocess.run(
+        [sys.executable, __file__, "--worker", backend, "--texts", texts_path, "--out", out,
+         "--model", args.model, "--threads", str(args.threads), "--single", str(args.single)],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        print(f"{backend}: failed\n{result.stderr.strip().splitlines()[-1] if result.stderr else ''}")
+        return None, None
+    return json.loads(result.stdout.strip().splitlines()[-1]), np.load(out)
+
+
+def unit(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def neighbour_overlap(reference, candidate, k=10):
+    """Mean fraction of shared top-k neighbours (excluding the text itself)."""
+    k = min(k, len(reference) - 1)
+    ref_sim, cand_sim = reference @ reference.T, candidate @ candidate.T
+    np.fill_diagonal(ref_sim, -np.inf)
+    np.fill_diagonal(cand_sim, -np.inf)
+    ref_top = np.argsort(-ref_sim, axis=1)[:, :k]
+    cand_top = np.argsort(-cand_sim, axis=1)[:, :k]
+    return float(np.mean([len(set(a) & set(b)) / k for a, b in zip(ref_top, cand_top)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx_int8"])
+    parser.add_argument("--model", default=None, help="defaults to EMBEDDING_MODEL")
+    parser.add_argument("--threads", type=int, default=0, help="intra-op threads, 0 = runtime default")
+    parser.add_argument("--corpus", help="text file with one sample text per line")
+    parser.add_argument("--single", type=int, default=32, help="texts timed one at a time")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--texts", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.model is None:
+        from vampire_chat.config.settings import EMBEDDING_MODEL
+        args.model = EMBEDDING_MODEL
+    if args.worker:
+        worker(args)
+        return
+
+    texts = Path(args.corpus).read_text(encoding="utf-8").splitlines() if args.corpus else sample_corpus()
+    texts = [text for text in texts if text.strip()]
+    backends = ["torch"] + [backend for backend in args.backends if backend != "torch"]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        texts_path = str(Path(workdir) / "texts.txt")
+        Path(texts_path).write_text("\n".join(texts), encoding="utf-8")
+
+        print(f"{len(texts)} texts, model {args.model}, threads {args.threads or 'default'}\n")
+        print(f"{'backend':<10} {'load s':>7} {'RSS MiB':>8} {'1-text ms':>10} {'texts/s':>8} "
+              f"{'cos mean':>9} {'cos min':>8} {'top10':>6}")
+        reference = None
+        for backend in backends:
+            stats, embeddings = run_backend(backend, args, texts_path, workdir)
+            if stats is None:
+                continue
+            embeddings = unit(embeddings)
+            if backend == "torch":
+                reference = embeddings
+            if reference is not None and reference.shape == embeddings.shape:
+                cosines = np.sum(reference * embeddings, axis=1)
+                parity = f"{cosines.mean():>9.5f} {cosines.min():>8.5f} {neighbour_overlap(reference, embeddings):>6.3f}"
+            else:
+                parity = f"{'n/a':>9} {'n/a':>8} {'n/a':>6}"
+            print(f"{backend:<10} {stats['load_seconds']:>7.2f} {stats['rss_mib']:>8.1f} "
+                  f"{stats['single_ms_p50']:>10.2f} {stats['batch_texts_per_s']:>8.0f} {parity}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Stress VectorStore with concurrent writers and readers.
+
+Writer threads append messages to their own conversation and immediately
+search for what they wrote (read-your-writes). Reader threads run unscoped,
+conversation-scoped and role-scoped searches the whole time and check that
+every hit is consistent with its scope. At the end the index, raw vectors
+and metadata must agree, and a reopened store must see every message.
+
+    python benchmarks/stress_vector_store.py --writers 8 --readers 16 --messages 4000
+    python benchmarks/stress_vector_store.py --index-kind hnsw   # also swap indexes mid-run
+"""
+import argparse
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from vampire_chat.database.vector_store import VectorStore
+from vampire_chat.utils.timing import LatencyRecorder
+
+
+def open_store(workdir, index_kind):
+    return VectorStore(
+        index_path=str(Path(workdir) / "index"),
+        messages_path=str(Path(workdir) / "messages.json"),
+        metadata_path=str(Path(workdir) / "metadata"),
+        checkpoint_interval=250,
+        index_kind=index_kind,
+    )
+
+
+def content_for(writer, i):
+    return f"writer {writer} says message number {i} about bats and moonlight"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--messages", type=int, default=4000, help="messages written in total")
+    parser.add_argument("--index-kind", default="auto")
+    args = parser.parse_args()
+
+    per_writer = args.messages // args.writers
+    recorder = LatencyRecorder()
+    errors = []
+    done = threading.Event()
+
+    def fail(message):
+        errors.append(message)
+        done.set()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        store = open_store(workdir, args.index_kind)
+        # Seed every conversation so readers never spin on an empty store
+        store.add_messages([
+            {"message_id": f"{w}-0", "conversation_id": f"conversation-{w}", "role": "assistant",
+             "content": content_for(w, 0)}
+            for w in range(args.writers)
+        ])
+        barrier = threading.Barrier(args.writers + args.readers + 1)
+
+        def writer(w):
+            barrier.wait()
+            conversation_id = f"conversation-{w}"
+            for i in range(1, per_writer):
+                if done.is_set():
+                    return
+                with recorder.measure("add_message"):
+                    store.add_message({
+                        "message_id": f"{w}-{i}",
+                        "conversation_id": conversation_id,
+                        "role": "user" if i % 2 else "assistant",
+                        "content": content_for(w, i),
+                    })
+                if i % 10 == 0:
+                    hits = store.search_similar_messages(content_for(w, i), k=1, conversation_ids=[conversation_id])
+                    if not hits or hits[0]["id"] != f"{w}-{i}":
+                        fail(f"writer {w} could not read back message {i}: {hits}")
+
+        def reader(r):
+            rng = random.Random(r)
+            barrier.wait()
+            while not done.is_set():
+                w = rng.randrange(args.writers)
+                scope = rng.choice(("all", "conversation", "role"))
+                with recorder.measure(f"search_{scope}"):
+                    if scope == "all":
+                        hits = store.search_similar_messages(content_for(w, rng.randrange(per_writer)), k=5)
+                    elif scope == "conversation":
+                        hits = store.search_similar_messages(
+                            content_for(w, rng.randrange(per_writer)), k=5, conversation_ids=[f"conversation-{w}"]
+                        )
+                    else:
+                        hits = store.search_similar_messages(content_for(w, rng.randrange(per_writer)), k=5, role="user")
+                for hit in hits:
+                    writer_id, i = hit["id"].split("-")
+                    if hit["content"] != content_for(writer_id, i) or hit["conversation_id"] != f"conversation-{writer_id}":
+                        fail(f"torn read: {hit}")
+                    if scope == "conversation" and hit["conversation_id"] != f"conversation-{w}":
+                        fail(f"hit outside conversation scope: {hit}")
+                    if scope == "role" and hit["role"] != "user":
+                        fail(f"hit outside role scope: {hit}")
+
+        writers = [threading.Thread(target=writer, args=(w,)) for w in range(args.writers)]
+        readers = [threading.Thread(target=reader, args=(r,)) for r in range(args.readers)]
+        for thread in writers + readers:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in writers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        written = (per_writer - 1) * args.writers
+        done.set()
+        for thread in readers:
+            thread.join()
+
+        total = per_writer * args.writers
+        if not errors:
+            sizes = (store.index.ntotal, len(store.vectors), len(store.messages))
+            if sizes != (total, total, total):
+                fail(f"index/vectors/metadata sizes disagree: {sizes}, expected {total}")
+            missing = [f"{w}-{i}" for w in range(args.writers) for i in range(per_writer)
+                       if store.row_for(f"{w}-{i}") is None]
+            if missing:
+                fail(f"{len(missing)} messages have no row, e.g. {missing[:5]}")
+        store.close()
+
+        if not errors:
+            reopened = open_store(workdir, args.index_kind)
+            if len(reopened.messages) != total or reopened.index.ntotal != total:
+                fail(f"reopened store has {len(reopened.messages)} rows, expected {total}")
+            reopened.close()
+
+    print(f"{total} messages from {args.writers} writers with {args.readers} readers in {elapsed:.2f}s "
+          f"({written / elapsed:.0f} msg/s)")
+    print(f"{'stage':>20} {'count':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for stage, stats in sorted(recorder.summary().items()):
+        print(f"{stage:>20} {stats['count']:>8} {stats['p50'] * 1000:>8.2f} "
+              f"{stats['p95'] * 1000:>8.2f} {stats['p99'] * 1000:>8.2f}")
+    if errors:
+        print(f"FAILED: {len(errors)} errors, first: {errors[0]}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,12 +9,13 @@ setup(
     version="0.1.0",
     packages=find_packages(exclude=["tests*", "docs*"]),
     install_requires=[
-        "gradio>=4.0.0",
+        "gradio>=5.0",
         "openai>=1.0.0",
         "python-dotenv>=1.0.0",
         "faiss-cpu>=1.7.4",
         "sentence-transformers>=2.2.2",
         "numpy>=1.24.0",
+        "tiktoken>=0.5.0",
         "SpeechRecognition>=3.10.0",
         "sounddevice>=0.4.6",
     ],
@@ -30,6 +31,15 @@ setup(
             "sphinx>=4.0.0",
             "sphinx-rtd-theme>=1.0.0",
         ],
+        "onnx": [
+            "sentence-transformers[onnx]>=3.2.0",
+        ],
+        "speech": [
+            "faster-whisper>=1.0.0",
+        ],
+        "vosk": [
+            "vosk>=0.3.45",
+        ],
     },
     entry_points={
         "console_scripts": [
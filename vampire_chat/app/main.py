@@ -1,27 +1,100 @@
+import time
+# Import time is measured from here, so it includes gradio, openai etc.
+_IMPORT_START = time.perf_counter()
+
 import os
+import uuid
 import gradio as gr
 from pathlib import Path
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from dotenv import load_dotenv
-import speech_recognition as sr
 import numpy as np
-from vampire_chat.utils.chat_history import ChatHistoryManager
+from vampire_chat.config.settings import (
+    CHAT_CONCURRENCY_LIMIT,
+    EMBEDDING_MODEL,
+    PROMPT_SUMMARY_TOKENS,
+    STT_STREAM_EVERY,
+    SUMMARY_MODEL,
+)
+from vampire_chat.database.encoder import get_model
+from vampire_chat.utils.chat_history import SYSTEM_PROMPT, SharedResources
+from vampire_chat.utils.executors import run_compute, run_io
+from vampire_chat.utils.response_cache import persona_key
+from vampire_chat.utils.session_manager import SessionManager
+from vampire_chat.utils.speech import StreamingTranscriber, create_speech_engine, to_mono_float32
+from vampire_chat.utils.startup import Startup
+from vampire_chat.utils.timing import latency
 
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI client and chat history manager
-client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
-chat_manager = ChatHistoryManager()
+def summarize_turns(previous_summary, messages):
+    """Fold conversation turns that no longer fit the prompt into a running summary."""
+    transcript = "\n".join(f"{msg['role']}: {msg['content']}" for msg in messages)
+    client, _ = startup.get("openai")
+    response = client.chat.completions.create(
+        model=SUMMARY_MODEL,
+        messages=[
+            {
+                "role": "system",
+                "content": "Summarize this chat between Lilly the vampire and a child. "
+                           "Keep names, facts about the child and open topics. Be brief."
+            },
+            {
+                "role": "user",
+                "content": f"Summary so far:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"
+            },
+        ],
+        temperature=0.3,
+        max_tokens=PROMPT_SUMMARY_TOKENS
+    )
+    return response.choices[0].message.content
+
+def create_openai_clients():
+    """The async client serves the request path; the sync one is used by the
+    background summarizer thread."""
+    return OpenAI(api_key=os.environ["OPENAI_API_KEY"]), AsyncOpenAI(api_key=os.environ["OPENAI_API_KEY"])
+
+def create_sessions():
+    """Every browser session gets its own conversation state on top of one
+    shared embedding model, FAISS index and database pool."""
+    return SessionManager(SharedResources(summarizer=summarize_turns))
+
+# Nothing heavy happens at import: clients, the embedding model, the index
+# and the speech recognizer are built on background threads once main()
+# starts them (or on first use), while the UI comes up
+startup = Startup()
+startup.add("openai", create_openai_clients)
+startup.add("embedding_model", get_model, EMBEDDING_MODEL)
+startup.add("sessions", create_sessions)
+startup.add("speech", create_speech_engine)
+
+# Phases a chat request has to wait for
+CHAT_PHASES = ("openai", "embedding_model", "sessions")
+
+CHAT_MODEL = "gpt-4-1106-preview"
+# Cached replies are only reused for the persona and model that wrote them
+PERSONA = persona_key(SYSTEM_PROMPT, CHAT_MODEL)
+
+def session_id(request):
+    return request.session_hash if request else "default"
+
+def get_chat_manager(request):
+    """Return the ChatHistoryManager of the browser session behind a request."""
+    return startup.get("sessions").get(session_id(request))
+
+def identify_user(user_id):
+    """Give a browser a persistent user id the first time it visits."""
+    return user_id or str(uuid.uuid4())
 
-# Initialize speech recognizer
-recognizer = sr.Recognizer()
+# Microphone audio streamed by each session since recording started
+transcribers = {}
 
 # Get the package root directory
 PACKAGE_ROOT = Path(__file__).parent.parent.parent
 
 def create_avatar_images():
-    """Create and save avatar images."""
+    """Create and save avatar images, leaving files that are already up to date."""
     assets_dir = PACKAGE_ROOT / "assets"
     assets_dir.mkdir(exist_ok=True)
     
@@ -52,46 +125,83 @@ def create_avatar_images():
     """
     
     # Save avatars
-    with open(assets_dir / "vampire.svg", "w") as f:
-        f.write(vampire_avatar)
-    with open(assets_dir / "girl.svg", "w") as f:
-        f.write(girl_avatar)
+    for name, svg in (("vampire.svg", vampire_avatar), ("girl.svg", girl_avatar)):
+        path = assets_dir / name
+        if path.exists() and path.read_text() == svg:
+            continue
+        with open(path, "w") as f:
+            f.write(svg)
 
-def transcribe_audio(audio):
-    """Convert audio input to text using Google Speech Recognition."""
-    if audio is None:
-        return None
-    
+def transcribe_speech(audio):
+    """Transcribe 16 kHz mono audio, waiting for the speech engine if it is still loading."""
+    return startup.get("speech").transcribe(audio)
+
+def stream_audio(chunk, request: gr.Request = None):
+    """Feed microphone audio to the session's transcriber while the child talks.
+
+    Each utterance is transcribed in the background as soon as the child
+    pauses, so the text is ready when recording stops.
+    """
+    if chunk is None:
+        return
+    transcriber = transcribers.get(session_id(request))
+    if transcriber is None:
+        transcriber = transcribers[session_id(request)] = StreamingTranscriber(transcribe_speech)
+    transcriber.feed(*chunk)
+
+def start_recording(request: gr.Request = None):
+    """Drop audio a previous recording may have left behind."""
+    transcribers.pop(session_id(request), None)
+
+def transcribe_audio(audio, session=None):
+    """Convert a finished recording to text.
+
+    A streamed recording only waits for its last utterance; one that was
+    not streamed is converted to 16 kHz mono and transcribed whole.
+    """
+    transcriber = transcribers.pop(session, None)
     try:
-        # Get the audio data and sample rate
-        y = audio[1]
-        sr_audio = audio[0]
-        
-        # Convert numpy array to audio data
-        audio_data = sr.AudioData(y.tobytes(), sr_audio, 2)
-        
-        # Perform the transcription
-        text = recognizer.recognize_google(audio_data, language="en-US")
+        if transcriber is not None:
+            text = transcriber.finish()
+        elif audio is not None:
+            sample_rate, samples = audio
+            text = transcribe_speech(to_mono_float32(samples, sample_rate))
+        else:
+            return None
+        if not text:
+            print("Speech Recognition could not understand the audio")
+            return None
         print(f"Transcribed text: {text}")
         return text
-        
-    except sr.UnknownValueError:
-        print("Speech Recognition could not understand the audio")
-        return None
-    except sr.RequestError as e:
-        print(f"Could not request results from Speech Recognition service; {e}")
-        return None
     except Exception as e:
         print(f"Transcription error: {e}")
         return None
 
-def chat_with_lilly(message, history, audio=None):
-    """Handle chat interaction with the vampire assistant."""
-    if audio is not None:
+async def chat_with_lilly(message, history, user_id=None, audio=None, request: gr.Request = None, voice=False):
+    """Handle chat interaction with the vampire assistant, streaming the reply.
+
+    ``user_id`` is the browser's persistent id, which scopes retrieval to
+    that user's conversations; before the browser has one, the session
+    stands in for it. Blocking work (speech recognition, SQLite, embedding,
+    FAISS) runs on thread pools, so the event loop can serve many chats
+    concurrently.
+    """
+    # Requests that arrive while the app is still starting up wait here
+    if not startup.ready(*CHAT_PHASES):
+        yield history + [{"role": "assistant", "content": "Lilly is just waking up, one moment..."}]
+    for name in CHAT_PHASES:
+        await startup.get_async(name)
+    _, async_client = startup.get("openai")
+    response_cache = startup.get("sessions").resources.response_cache
+
+    chat_manager = get_chat_manager(request)
+    chat_manager.set_user(user_id or session_id(request))
+    if voice or audio is not None:
         # If audio is provided, transcribe it
-        transcribed_text = transcribe_audio(audio)
+        transcribed_text = await run_io(transcribe_audio, audio, session_id(request))
         if not transcribed_text:
-            return [{"role": "assistant", "content": "I couldn't understand the audio clearly. Could you please try speaking more clearly or use the text input instead?"}]
+            yield [{"role": "assistant", "content": "I couldn't understand the audio clearly. Could you please try speaking more clearly or use the text input instead?"}]
+            return
         # Update message with transcribed text
         message = transcribed_text
         
@@ -99,41 +209,79 @@ def chat_with_lilly(message, history, audio=None):
         history.append({"role": "user", "content": message})
     
     if message.lower().strip() == "exit":
-        return [{"role": "assistant", "content": "Conversation ended."}]
+        yield [{"role": "assistant", "content": "Conversation ended."}]
+        return
 
     # Add user message to history if it wasn't from audio
     if audio is None:
-        chat_manager.add_message(role="user", content=message)
+        await chat_manager.add_message_async(role="user", content=message)
     else:
-        chat_manager.add_message(role="user", content=message)
+        await chat_manager.add_message_async(role="user", content=message)
     
     # Get relevant context from previous conversations
-    context = chat_manager.get_relevant_context(message)
+    context = await chat_manager.get_relevant_context_async(message)
     
-    # Format conversation for OpenAI
-    messages = chat_manager.format_conversation_for_openai()
+    # Repeated questions are answered from the semantic cache when enabled.
+    # Cached replies are shared by all users, so only replies that depend on
+    # nothing but the question qualify: the question opens its conversation
+    # and nothing was retrieved for it
+    cacheable = (
+        response_cache.enabled
+        and not context
+        and not await run_io(chat_manager.has_history)
+    )
+    if cacheable:
+        start = time.perf_counter()
+        cached = await run_compute(response_cache.get, message, PERSONA)
+        if cached is not None:
+            latency.record("response_cache_hit", time.perf_counter() - start)
+            history.append({"role": "assistant", "content": cached})
+            yield history
+            await chat_manager.add_message_async(role="assistant", content=cached)
+            return
     
-    # If we have relevant context, add it to the system message
-    if context:
-        messages[0]["content"] += f"\n\nRelevant context from previous conversations:\n{context}"
+    # Format conversation for OpenAI, fitting history and context into the token budget
+    messages = await chat_manager.format_conversation_for_openai_async(context=context)
     
-    # Get response from OpenAI
-    response = client.chat.completions.create(
-        model="gpt-4-1106-preview",
+    # Stream the response from OpenAI into the chat history as it arrives
+    start = time.perf_counter()
+    first_token = None
+    response = await async_client.chat.completions.create(
+        model=CHAT_MODEL,
         messages=messages,
         temperature=0.7,
-        max_tokens=1000
+        max_tokens=1000,
+        stream=True
     )
     
-    assistant_message = response.choices[0].message.content
+    assistant_message = ""
+    history.append({"role": "assistant", "content": ""})
+    async for chunk in response:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if not delta:
+            continue
+        if first_token is None:
+            first_token = time.perf_counter() - start
+            latency.record("llm_first_token", first_token)
+        assistant_message += delta
+        history[-1]["content"] = assistant_message
+        yield history
     
-    # Add assistant's response to history
-    chat_manager.add_message(role="assistant", content=assistant_message)
+    total = time.perf_counter() - start
+    latency.record("llm_total", total)
+    print(f"LLM time to first token: {first_token or total:.2f}s, total: {total:.2f}s")
     
-    # Update the chat history with the new messages
-    history.append({"role": "assistant", "content": assistant_message})
+    # Persist the assistant's response only once the stream has completed
+    await chat_manager.add_message_async(role="assistant", content=assistant_message)
+    if cacheable:
+        await run_compute(response_cache.put, message, PERSONA, assistant_message)
     
-    return history
+    yield history
+
+async def chat_with_lilly_voice(history, audio=None, user_id=None, request: gr.Request = None):
+    """Answer a finished microphone recording, streamed or not."""
+    async for update in chat_with_lilly("", history, user_id, audio, request, voice=True):
+        yield update
 
 # Custom CSS for the chat interface
 custom_css = """
@@ -214,13 +362,21 @@ custom_css = """
 }
 """
 
+def clear_conversation(request: gr.Request):
+    """Start a fresh conversation for this session only."""
+    get_chat_manager(request).start_new_conversation()
+    return []
+
+def end_session(request: gr.Request):
+    """Drop a session's conversation state when its browser tab closes."""
+    startup.get("sessions").end(request.session_hash)
+    transcribers.pop(request.session_hash, None)
+
 def create_chat_interface():
     """Create and configure the Gradio chat interface."""
     # Create avatar images
-    create_avatar_images()
-    
-    # Start a new conversation
-    chat_manager.start_new_conversation()
+    with startup.phase("avatars"):
+        create_avatar_images()
     
     # Create theme
     theme = gr.themes.Soft(
@@ -242,14 +398,10 @@ def create_chat_interface():
         with gr.Row():
             gr.HTML("<p>Hi! I'm Lilly, your friendly teenage vampire friend! What would you like to talk about?</p>")
         
-        # Initialize chat history
-        initial_history = [
-            {"role": msg["role"], "content": msg["content"]}
-            for msg in chat_manager.get_conversation_history()
-        ]
-        
+        # Each session starts with an empty chat; its conversation is created
+        # on the first message
         chatbot = gr.Chatbot(
-            value=initial_history,
+            value=[],
             avatar_images=[str(PACKAGE_ROOT / "assets/girl.svg"), str(PACKAGE_ROOT / "assets/vampire.svg")],
             height=600,
             bubble_full_width=False,
@@ -269,13 +421,21 @@ def create_chat_interface():
                     sources=["microphone"],
                     type="numpy",
                     label="Or speak your message",
-                    streaming=False
+                    streaming=True
                 )
         
+        # A persistent id kept in the browser ties its sessions to one user.
+        # Gradio releases without BrowserState keep it for the session only
+        if hasattr(gr, "BrowserState"):
+            user_id = gr.BrowserState(None, storage_key="vampire_chat_user_id")
+        else:
+            user_id = gr.State(None)
+        chat_interface.load(identify_user, [user_id], [user_id])
+        
         # Handle text input
         text_input.submit(
             chat_with_lilly,
-            [text_input, chatbot],
+            [text_input, chatbot, user_id],
             [chatbot],
         ).then(
             lambda: "",
@@ -283,10 +443,20 @@ def create_chat_interface():
             [text_input],
         )
         
-        # Handle audio input
+        # Handle audio input: chunks are transcribed while the child talks,
+        # and the reply starts as soon as recording stops
+        audio_input.start_recording(start_recording, None, None)
+        audio_input.stream(
+            stream_audio,
+            [audio_input],
+            None,
+            stream_every=STT_STREAM_EVERY,
+            concurrency_limit=CHAT_CONCURRENCY_LIMIT,
+            show_progress="hidden",
+        )
         audio_input.stop_recording(
-            chat_with_lilly,
-            [gr.State(""), chatbot, audio_input],
+            chat_with_lilly_voice,
+            [chatbot, audio_input, user_id],
             [chatbot],
         ).then(
             lambda: None,  # Clear the audio input after processing
@@ -298,20 +468,28 @@ def create_chat_interface():
         with gr.Row():
             clear = gr.Button("Clear Conversation")
             clear.click(
-                lambda: ([], chat_manager.start_new_conversation()),
+                clear_conversation,
                 None,
                 [chatbot],
             )
+        
+        # Release the session's state as soon as its browser tab goes away
+        chat_interface.unload(end_session)
     
     return chat_interface
 
 def main():
     """Launch the chat application."""
-    chat_interface = create_chat_interface()
-    chat_interface.queue().launch(
+    # Load models, index and clients in the background while the UI is built
+    startup.start()
+    with startup.phase("ui"):
+        chat_interface = create_chat_interface()
+    chat_interface.queue(default_concurrency_limit=CHAT_CONCURRENCY_LIMIT).launch(
         share=False,
         show_error=True
     )
 
+startup.record("import", time.perf_counter() - _IMPORT_START)
+
 if __name__ == "__main__":
     main()
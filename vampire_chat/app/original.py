@@ -4,14 +4,17 @@ from dotenv import load_dotenv
 load_dotenv()  # Load API keys from .env file
 
 import os
-import json
 import time
 import gradio as gr
+import openai
 from openai import OpenAI
 from tavily import TavilyClient
 import base64
 from pathlib import Path
 
+from vampire_chat.utils.assistant_registry import AssistantRegistry, SessionThreads
+from vampire_chat.utils.tool_executor import CachedToolExecutor
+
 # Initialize clients with API keys
 client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
 tavily_client = TavilyClient(api_key=os.environ["TAVILY_API_KEY"])
@@ -64,100 +67,178 @@ You should never use your own knowledge to answer questions.
 Please include relevant url sources at the end of your responses.
 """
 
+# Search results are cached for as long as the time range they cover
+TAVILY_TIME_RANGE = "month"
+TIME_RANGE_SECONDS = {"day": 86400, "week": 7 * 86400, "month": 30 * 86400, "year": 365 * 86400}
+
 # Function to perform a Tavily search
 def tavily_search(query):
-    search_result = tavily_client.get_search_context(query, search_depth="advanced", time_range="month", max_tokens=8000)
+    search_result = tavily_client.get_search_context(query, search_depth="advanced", time_range=TAVILY_TIME_RANGE, max_tokens=8000)
     return search_result
 
-# Function to wait for a run to complete
-def wait_for_run_completion(thread_id, run_id):
+# Tool calls run concurrently, and identical searches (cached or in flight)
+# from any chat are answered once
+tool_executor = CachedToolExecutor({"tavily_search": tavily_search}, ttl=TIME_RANGE_SECONDS[TAVILY_TIME_RANGE])
+
+# Run states in which a run needs nothing more from the server side
+FINAL_RUN_STATUSES = ('completed', 'failed', 'cancelled', 'expired', 'incomplete', 'requires_action')
+
+# Function to wait for a run to complete, polling with adaptive backoff.
+# Only used when a run cannot be streamed (see RunStream below).
+def wait_for_run_completion(thread_id, run_id, initial_delay=0.05, max_delay=1.0):
+    delay = initial_delay
     while True:
-        time.sleep(1)
+        time.sleep(delay)
         run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
-        if run.status in ['completed', 'failed', 'requires_action']:
+        if run.status in FINAL_RUN_STATUSES:
             return run
+        delay = min(delay * 2, max_delay)
 
 # Function to handle tool output submission
 def submit_tool_outputs(thread_id, run_id, tools_to_call):
-    tool_output_array = []
-    for tool in tools_to_call:
-        output = None
-        tool_call_id = tool.id
-        function_name = tool.function.name
-        function_args = tool.function.arguments
-
-        if function_name == "tavily_search":
-            output = tavily_search(query=json.loads(function_args)["query"])
-
-        if output:
-            tool_output_array.append({"tool_call_id": tool_call_id, "output": output})
-
     return client.beta.threads.runs.submit_tool_outputs(
         thread_id=thread_id,
         run_id=run_id,
-        tool_outputs=tool_output_array
+        tool_outputs=tool_executor.run(tools_to_call)
     )
 
-# Create an assistant
-assistant = client.beta.assistants.create(
-    instructions=assistant_prompt_instruction,
-    model="gpt-4-1106-preview",
-    tools=[{
-        "type": "function",
-        "function": {
-            "name": "tavily_search",
-            "description": "Get information on recent events from the web.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "query": {
-                        "type": "string", 
-                        "description": "The search query to use. For example: 'Latest news on Nvidia stock performance'"
-                    },
+class RunStream:
+    """Drive a run from its server-sent events instead of polling.
+
+    Iterating yields the reply text as it is generated. When the run asks
+    for tools, they are run as soon as the event arrives and their outputs
+    are submitted on a new stream, so neither phase waits for a poll. The
+    id and status of the run are kept so a broken stream can be finished
+    by polling (see run_polled).
+    """
+
+    def __init__(self, thread_id, assistant_id):
+        self.thread_id = thread_id
+        self.assistant_id = assistant_id
+        self.run_id = None
+        self.status = None
+        self.error = None
+
+    def __iter__(self):
+        stream = client.beta.threads.runs.create(
+            thread_id=self.thread_id,
+            assistant_id=self.assistant_id,
+            stream=True,
+        )
+        while stream is not None:
+            tools_to_call = None
+            with stream:
+                for event in stream:
+                    if getattr(event.data, "object", None) == "thread.run":
+                        self.run_id = event.data.id
+                        self.status = event.data.status
+                        if event.event == "thread.run.requires_action":
+                            tools_to_call = event.data.required_action.submit_tool_outputs.tool_calls
+                        elif event.event == "thread.run.failed":
+                            self.error = event.data.last_error
+                    elif event.event == "thread.message.delta":
+                        for part in event.data.delta.content or []:
+                            if part.type == "text" and part.text and part.text.value:
+                                yield part.text.value
+
+            stream = None
+            if tools_to_call:
+                stream = client.beta.threads.runs.submit_tool_outputs(
+                    thread_id=self.thread_id,
+                    run_id=self.run_id,
+                    tool_outputs=tool_executor.run(tools_to_call),
+                    stream=True,
+                )
+
+def run_polled(thread_id, assistant_id, run_id=None):
+    """Fallback: drive a run (a new one unless ``run_id`` is given) by polling and return the reply."""
+    if run_id is None:
+        run_id = client.beta.threads.runs.create(thread_id=thread_id, assistant_id=assistant_id).id
+
+    run = wait_for_run_completion(thread_id, run_id)
+    while run.status == 'requires_action':
+        run = submit_tool_outputs(thread_id, run.id, run.required_action.submit_tool_outputs.tool_calls)
+        run = wait_for_run_completion(thread_id, run.id)
+
+    # Handle the run status. A run that did not complete has no reply of its
+    # own: the thread's latest assistant message is the previous turn's
+    if run.status != 'completed':
+        return f"Error: {run.last_error or f'run {run.status}'}"
+
+    # Get the latest assistant message
+    messages = client.beta.threads.messages.list(thread_id=thread_id)
+    for msg in messages:
+        if msg.role == "assistant":
+            return msg.content[0].text.value
+
+# The assistant's tools
+assistant_tools = [{
+    "type": "function",
+    "function": {
+        "name": "tavily_search",
+        "description": "Get information on recent events from the web.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string", 
+                    "description": "The search query to use. For example: 'Latest news on Nvidia stock performance'"
                 },
-                "required": ["query"]
-            }
+            },
+            "required": ["query"]
         }
-    }]
+    }
+}]
+
+# The assistant is looked up (or created) on the first chat and reused
+# across restarts; nothing here talks to the API at import time
+assistant_registry = AssistantRegistry(
+    client,
+    model="gpt-4-1106-preview",
+    instructions=assistant_prompt_instruction,
+    tools=assistant_tools,
 )
-assistant_id = assistant.id
 
-# Create a thread (we reuse this thread for the session)
-thread = client.beta.threads.create()
+# Each browser session gets its own thread, so users' runs never queue
+# behind each other
+session_threads = SessionThreads(client)
 
-def chat_with_assistant(message, history):
-    """This function sends the user's input to the assistant and returns the response."""
+def end_session(request: gr.Request):
+    """Delete a session's thread when its browser tab closes."""
+    session_threads.end(request.session_hash)
+
+def chat_with_assistant(message, history, request: gr.Request = None):
+    """This function sends the user's input to the assistant and streams back the response."""
     if message.lower().strip() == "exit":
-        return "Conversation ended."
+        yield "Conversation ended."
+        return
+
+    thread_id = session_threads.get(request.session_hash if request else "default")
+    assistant_id = assistant_registry.get()
 
     # Create a user message in the thread
     client.beta.threads.messages.create(
-        thread_id=thread.id,
+        thread_id=thread_id,
         role="user",
         content=message,
     )
 
-    # Start a run with the assistant
-    run = client.beta.threads.runs.create(
-        thread_id=thread.id,
-        assistant_id=assistant_id,
-    )
-
-    # Wait for the run to complete
-    run = wait_for_run_completion(thread.id, run.id)
+    # Stream the run, falling back to polling if the stream breaks off
+    run_stream = RunStream(thread_id, assistant_id)
+    reply = ""
+    try:
+        for text in run_stream:
+            reply += text
+            yield reply
+    except openai.APIError:
+        yield run_polled(thread_id, assistant_id, run_stream.run_id)
+        return
 
-    # Handle the run status
-    if run.status == 'failed':
-        return f"Error: {run.error}"
-    elif run.status == 'requires_action':
-        run = submit_tool_outputs(thread.id, run.id, run.required_action.submit_tool_outputs.tool_calls)
-        run = wait_for_run_completion(thread.id, run.id)
-
-    # Get the latest assistant message
-    messages = client.beta.threads.messages.list(thread_id=thread.id)
-    for msg in messages:
-        if msg.role == "assistant":
-            return msg.content[0].text.value
+    if run_stream.status == 'failed':
+        yield f"Error: {run_stream.error}"
+    elif run_stream.status not in FINAL_RUN_STATUSES or not reply:
+        # The stream ended before the run did, or carried no text
+        yield run_polled(thread_id, assistant_id, run_stream.run_id)
 
 # Custom CSS for the chat interface
 custom_css = """
@@ -265,6 +346,9 @@ chat_interface = gr.ChatInterface(
     ]
 )
 
+# Release the session's thread as soon as its browser tab goes away
+chat_interface.unload(end_session)
+
 # Launch the interface
 if __name__ == "__main__":
     chat_interface.launch(share=False)
@@ -0,0 +1,151 @@
+"""
+Tunable settings for Vampire Chat.
+
+Every value can be overridden through an environment variable of the same name
+prefixed with ``VAMPIRE_``.
+"""
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(f"VAMPIRE_{name}", default))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.environ.get(f"VAMPIRE_{name}", default))
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(f"VAMPIRE_{name}")
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Vector store persistence
+VECTOR_CHECKPOINT_INTERVAL = _env_int("VECTOR_CHECKPOINT_INTERVAL", 500)
+# A checkpoint rewrites the whole index, so the log is only folded in once it
+# also holds this fraction of the index: rewrite cost per message stays flat
+VECTOR_CHECKPOINT_FRACTION = _env_float("VECTOR_CHECKPOINT_FRACTION", 0.1)
+VECTOR_LOG_FSYNC = _env_bool("VECTOR_LOG_FSYNC", False)
+# Appends queued by concurrent callers are applied together, up to this many
+VECTOR_WRITE_BATCH_SIZE = _env_int("VECTOR_WRITE_BATCH_SIZE", 64)
+
+# Vector index layout: "auto" promotes flat -> hnsw -> ivf_flat -> ivf_pq as
+# the store grows past the thresholds below, any other value pins the layout
+VECTOR_INDEX_KIND = os.environ.get("VAMPIRE_VECTOR_INDEX_KIND", "auto")
+VECTOR_PROMOTE_HNSW_AT = _env_int("VECTOR_PROMOTE_HNSW_AT", 20_000)
+VECTOR_PROMOTE_IVF_AT = _env_int("VECTOR_PROMOTE_IVF_AT", 500_000)
+VECTOR_PROMOTE_IVF_PQ_AT = _env_int("VECTOR_PROMOTE_IVF_PQ_AT", 5_000_000)
+VECTOR_HNSW_M = _env_int("VECTOR_HNSW_M", 32)
+VECTOR_PQ_M = _env_int("VECTOR_PQ_M", 16)
+# Rows read from disk per index.add call when an index is rebuilt
+VECTOR_REBUILD_CHUNK = _env_int("VECTOR_REBUILD_CHUNK", 65_536)
+
+# Recall/latency knobs applied at search time
+VECTOR_NPROBE = _env_int("VECTOR_NPROBE", 16)
+VECTOR_EF_SEARCH = _env_int("VECTOR_EF_SEARCH", 64)
+# Lossy layouts (fp16, sq8, ivf_pq) fetch k * VECTOR_RERANK candidates and
+# re-rank them exactly against the raw float32 vectors; 0 disables this
+VECTOR_RERANK = _env_int("VECTOR_RERANK", 4)
+
+# Filtered searches over at most this many candidates scan the raw vectors
+# exactly instead of running a selector-filtered search over the full index
+VECTOR_EXACT_SCAN_LIMIT = _env_int("VECTOR_EXACT_SCAN_LIMIT", 50_000)
+
+# Embedding encoder: content-hash LRU cache and micro-batching
+EMBEDDING_MODEL = os.environ.get("VAMPIRE_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_CACHE_SIZE = _env_int("EMBEDDING_CACHE_SIZE", 10_000)
+EMBEDDING_MAX_BATCH_SIZE = _env_int("EMBEDDING_MAX_BATCH_SIZE", 32)
+EMBEDDING_MAX_WAIT = _env_float("EMBEDDING_MAX_WAIT", 0.005)
+# Inference backend: "torch", "onnx" (ONNX Runtime) or "onnx_int8" (ONNX
+# Runtime, int8-quantized weights). All produce index-compatible vectors.
+# EMBEDDING_THREADS caps intra-op threads (0 = runtime default) and
+# EMBEDDING_ONNX_FILE picks a different export from the model repo.
+EMBEDDING_BACKEND = os.environ.get("VAMPIRE_EMBEDDING_BACKEND", "torch")
+EMBEDDING_THREADS = _env_int("EMBEDDING_THREADS", 0)
+EMBEDDING_ONNX_FILE = os.environ.get("VAMPIRE_EMBEDDING_ONNX_FILE", "")
+
+# SQLite connection pool
+DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 8)
+DB_CACHE_SIZE_KIB = _env_int("DB_CACHE_SIZE_KIB", 16_384)
+DB_MMAP_SIZE = _env_int("DB_MMAP_SIZE", 256 * 1024 * 1024)
+DB_SYNCHRONOUS = os.environ.get("VAMPIRE_DB_SYNCHRONOUS", "NORMAL")
+
+# In-memory conversation windows used for prompt assembly
+CONVERSATION_WINDOW_SIZE = _env_int("CONVERSATION_WINDOW_SIZE", 200)
+CONVERSATION_CACHE_SIZE = _env_int("CONVERSATION_CACHE_SIZE", 1_000)
+
+# Prompt assembly token budgets
+PROMPT_TOKEN_BUDGET = _env_int("PROMPT_TOKEN_BUDGET", 6_000)
+PROMPT_SYSTEM_TOKENS = _env_int("PROMPT_SYSTEM_TOKENS", 600)
+PROMPT_SUMMARY_TOKENS = _env_int("PROMPT_SUMMARY_TOKENS", 400)
+PROMPT_CONTEXT_TOKENS = _env_int("PROMPT_CONTEXT_TOKENS", 1_000)
+PROMPT_TOKENIZER = os.environ.get("VAMPIRE_PROMPT_TOKENIZER", "cl100k_base")
+SUMMARY_MODEL = os.environ.get("VAMPIRE_SUMMARY_MODEL", "gpt-3.5-turbo")
+
+# Context retrieval: BM25 (SQLite FTS5) and FAISS candidates fused with
+# reciprocal rank fusion; set RETRIEVAL_HYBRID=0 for embeddings only
+RETRIEVAL_HYBRID = _env_bool("RETRIEVAL_HYBRID", True)
+RETRIEVAL_CANDIDATES = _env_int("RETRIEVAL_CANDIDATES", 20)
+# Full-text searches scoped to at most this many conversations restrict the
+# FTS match itself to them, so they cost what the scope costs; wider scopes
+# filter the matches of the whole corpus instead
+RETRIEVAL_FTS_SCOPE_LIMIT = _env_int("RETRIEVAL_FTS_SCOPE_LIMIT", 64)
+RETRIEVAL_RRF_K = _env_int("RETRIEVAL_RRF_K", 60)
+# Candidates less similar (cosine) to the query than this are dropped, and
+# of two candidates at least RETRIEVAL_DEDUP_SIMILARITY alike only the
+# better one is kept. Scores halve every RETRIEVAL_HALF_LIFE_DAYS of age
+# (0 disables the decay).
+RETRIEVAL_MIN_SIMILARITY = _env_float("RETRIEVAL_MIN_SIMILARITY", 0.3)
+RETRIEVAL_DEDUP_SIMILARITY = _env_float("RETRIEVAL_DEDUP_SIMILARITY", 0.95)
+RETRIEVAL_HALF_LIFE_DAYS = _env_float("RETRIEVAL_HALF_LIFE_DAYS", 30.0)
+
+# Semantic cache of assistant replies to repeated questions (opt-in): a
+# prompt at least RESPONSE_CACHE_SIMILARITY cosine-similar to a cached one
+# for the same persona is answered from the cache. Only questions that open
+# a conversation and retrieve no context are cached or answered from it.
+RESPONSE_CACHE_ENABLED = _env_bool("RESPONSE_CACHE_ENABLED", False)
+RESPONSE_CACHE_SIMILARITY = _env_float("RESPONSE_CACHE_SIMILARITY", 0.95)
+RESPONSE_CACHE_TTL = _env_float("RESPONSE_CACHE_TTL", 24 * 60 * 60)
+RESPONSE_CACHE_SIZE = _env_int("RESPONSE_CACHE_SIZE", 1_000)
+
+# Tool results (e.g. web searches) cached by normalized arguments; the
+# default TTL matches the one-month time_range of the Tavily searches
+TOOL_CACHE_TTL = _env_float("TOOL_CACHE_TTL", 30 * 24 * 60 * 60)
+TOOL_CACHE_SIZE = _env_int("TOOL_CACHE_SIZE", 1_000)
+
+# Write-behind persistence of chat messages: callers are acknowledged once
+# a message is journaled, SQLite and the vector store catch up in batches
+WRITE_BEHIND_BATCH_SIZE = _env_int("WRITE_BEHIND_BATCH_SIZE", 64)
+WRITE_BEHIND_FSYNC = _env_bool("WRITE_BEHIND_FSYNC", False)
+WRITE_BEHIND_RETRY_DELAY = _env_float("WRITE_BEHIND_RETRY_DELAY", 1.0)
+# A batch still failing after this many retries is applied record by record
+# and the records that keep failing are moved to a dead-letter file
+WRITE_BEHIND_MAX_RETRIES = _env_int("WRITE_BEHIND_MAX_RETRIES", 5)
+# Under steady load the queue never drains, so the journal is rewritten
+# without its applied records once it holds this many records
+WRITE_BEHIND_COMPACT_AT = _env_int("WRITE_BEHIND_COMPACT_AT", 4_096)
+# Longest a history read waits for queued writes before serving what is stored
+WRITE_BEHIND_FLUSH_TIMEOUT = _env_float("WRITE_BEHIND_FLUSH_TIMEOUT", 5.0)
+
+# Speech-to-text: "whisper" (faster-whisper, local CPU), "vosk" (local CPU,
+# needs STT_VOSK_MODEL), "google" (Google Web Speech API) or "auto" (whisper
+# when installed, otherwise google). Microphone audio is streamed and an
+# utterance is transcribed once STT_END_SILENCE seconds of silence follow it.
+STT_BACKEND = os.environ.get("VAMPIRE_STT_BACKEND", "auto")
+STT_MODEL = os.environ.get("VAMPIRE_STT_MODEL", "base.en")
+STT_VOSK_MODEL = os.environ.get("VAMPIRE_STT_VOSK_MODEL", "")
+STT_THREADS = _env_int("STT_THREADS", 0)
+STT_LANGUAGE = os.environ.get("VAMPIRE_STT_LANGUAGE", "en-US")
+STT_END_SILENCE = _env_float("STT_END_SILENCE", 0.6)
+STT_STREAM_EVERY = _env_float("STT_STREAM_EVERY", 0.25)
+
+# Async request path: thread pools for blocking work and Gradio queue size
+IO_THREADS = _env_int("IO_THREADS", 32)
+COMPUTE_THREADS = _env_int("COMPUTE_THREADS", os.cpu_count() or 4)
+CHAT_CONCURRENCY_LIMIT = _env_int("CHAT_CONCURRENCY_LIMIT", 256)
+
+# Per-browser-session chat state
+SESSION_IDLE_TIMEOUT = _env_int("SESSION_IDLE_TIMEOUT", 30 * 60)
+SESSION_SWEEP_INTERVAL = _env_int("SESSION_SWEEP_INTERVAL", 60)
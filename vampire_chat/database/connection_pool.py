@@ -0,0 +1,87 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from queue import Empty, LifoQueue
+from typing import Iterator, List
+
+from ..config.settings import DB_CACHE_SIZE_KIB, DB_MMAP_SIZE, DB_POOL_SIZE, DB_SYNCHRONOUS
+
+
+class ConnectionPool:
+    """Thread-safe pool of SQLite connections running in WAL mode.
+
+    Connections are created lazily up to ``size`` and handed out one thread
+    at a time. Each keeps its own prepared-statement cache, so reusing a
+    connection also reuses the compiled statements of earlier calls.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        size: int = DB_POOL_SIZE,
+        timeout: float = 30.0,
+        cache_size_kib: int = DB_CACHE_SIZE_KIB,
+        mmap_size: int = DB_MMAP_SIZE,
+        synchronous: str = DB_SYNCHRONOUS,
+    ):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+        self.synchronous = synchronous
+
+        self._idle: LifoQueue = LifoQueue()
+        self._all: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=256,
+        )
+        # WAL lets readers run alongside the single writer instead of
+        # blocking on the file lock; NORMAL sync is durable across crashes
+        # of the process and only fsyncs at checkpoints
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA cache_size=-{self.cache_size_kib}")
+        conn.execute(f"PRAGMA mmap_size={self.mmap_size}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except Empty:
+            pass
+        with self._lock:
+            if len(self._all) < self.size:
+                conn = self._connect()
+                self._all.append(conn)
+                return conn
+        return self._idle.get(timeout=self.timeout)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection; commits on success and rolls back on error."""
+        conn = self._acquire()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        """Close every connection the pool has opened."""
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
+        self._idle = LifoQueue()
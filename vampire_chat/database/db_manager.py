@@ -1,15 +1,128 @@
-import sqlite3
-from datetime import datetime
-from typing import List, Dict, Optional
+import re
+from typing import List, Dict, Iterable, Optional, Tuple
+
+from ..config.settings import DB_POOL_SIZE, RETRIEVAL_FTS_SCOPE_LIMIT
+from ..utils.timing import latency
+from .connection_pool import ConnectionPool
+
+# Schema migrations, applied in order on top of the tables created by
+# _create_tables. A database records how many it has applied in
+# PRAGMA user_version, so only append to this list, never reorder it.
+MIGRATIONS = [
+    # 1: serve per-conversation history from an index instead of a full
+    # table scan plus sort (rowid breaks timestamp ties and is implicitly
+    # part of every index entry)
+    [
+        """CREATE INDEX IF NOT EXISTS idx_messages_conversation_timestamp
+           ON messages (conversation_id, timestamp)""",
+        """CREATE INDEX IF NOT EXISTS idx_conversations_last_updated
+           ON conversations (last_updated)""",
+    ],
+    # 2: BM25 full-text search over message content. The FTS table only
+    # indexes the text (external content) and is kept in sync by triggers;
+    # rows are joined back to messages by rowid.
+    [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+               content,
+               content='messages',
+               content_rowid='rowid',
+               tokenize='porter unicode61 remove_diacritics 2'
+           )""",
+        """CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+               INSERT INTO messages_fts (rowid, content) VALUES (new.rowid, new.content);
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+               INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+               INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+               INSERT INTO messages_fts (rowid, content) VALUES (new.rowid, new.content);
+           END""",
+        "INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')",
+    ],
+    # 3: index each message's conversation in FTS as well, as one token
+    # (see _conversation_key), so scoped full-text searches intersect with a
+    # short posting list instead of matching the whole corpus first. The
+    # key is computed by a view that serves as the external content.
+    [
+        "DROP TRIGGER IF EXISTS messages_fts_insert",
+        "DROP TRIGGER IF EXISTS messages_fts_delete",
+        "DROP TRIGGER IF EXISTS messages_fts_update",
+        "DROP TABLE IF EXISTS messages_fts",
+        """CREATE VIEW IF NOT EXISTS messages_fts_source AS
+           SELECT rowid, content, 'c' || replace(conversation_id, '-', '') AS conversation_key
+           FROM messages""",
+        """CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+               content,
+               conversation_key,
+               content='messages_fts_source',
+               content_rowid='rowid',
+               tokenize='porter unicode61 remove_diacritics 2'
+           )""",
+        """CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+               INSERT INTO messages_fts (rowid, content, conversation_key)
+               VALUES (new.rowid, new.content, 'c' || replace(new.conversation_id, '-', ''));
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+               INSERT INTO messages_fts (messages_fts, rowid, content, conversation_key)
+               VALUES ('delete', old.rowid, old.content, 'c' || replace(old.conversation_id, '-', ''));
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content, conversation_id ON messages BEGIN
+               INSERT INTO messages_fts (messages_fts, rowid, content, conversation_key)
+               VALUES ('delete', old.rowid, old.content, 'c' || replace(old.conversation_id, '-', ''));
+               INSERT INTO messages_fts (rowid, content, conversation_key)
+               VALUES (new.rowid, new.content, 'c' || replace(new.conversation_id, '-', ''));
+           END""",
+        "INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')",
+    ],
+    # 4: record which user a conversation belongs to, so retrieval can
+    # cover all of a user's conversations and nobody else's
+    [
+        "ALTER TABLE conversations ADD COLUMN user_id TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_conversations_user ON conversations (user_id)",
+    ],
+]
+
+# Words too common to be worth matching on in full-text queries
+_STOPWORDS = frozenset("""
+    a an and are as at be but by can did do does for from had has have he her him his how i if in is it its
+    me my no not of on or our she so that the their them then there they this to too was we were what when
+    where which who why will with you your
+""".split())
+
+def _fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query matching any of its significant words.
+
+    Every word is quoted, so user input can never be parsed as FTS5 syntax.
+    """
+    words = dict.fromkeys(word for word in re.findall(r"\w+", text.lower()) if word not in _STOPWORDS)
+    return " OR ".join(f'"{word}"' for word in words)
+
+def _conversation_key(conversation_id: str) -> str:
+    """The FTS phrase matching a conversation's key, as the migration 3 view builds it."""
+    return '"c' + conversation_id.replace("-", "").replace('"', '""') + '"'
+
+def _encode_cursor(timestamp: str, rowid: int) -> str:
+    return f"{timestamp}|{rowid}"
+
+def _decode_cursor(cursor: str) -> Tuple[str, int]:
+    timestamp, rowid = cursor.rsplit("|", 1)
+    return timestamp, int(rowid)
 
 class DatabaseManager:
-    def __init__(self, db_path: str = "vampire_chat/database/chat_history.db"):
+    def __init__(self, db_path: str = "vampire_chat/database/chat_history.db", pool_size: int = DB_POOL_SIZE):
         self.db_path = db_path
+        self.pool = ConnectionPool(db_path, size=pool_size)
         self._create_tables()
+        self._migrate()
+
+    def close(self) -> None:
+        """Close all pooled connections."""
+        self.pool.close()
 
     def _create_tables(self):
         """Create necessary tables if they don't exist."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
             
             # Create conversations table
@@ -35,19 +148,29 @@ class DatabaseManager:
             
             conn.commit()
 
-    def create_conversation(self, conversation_id: str) -> None:
-        """Create a new conversation."""
-        with sqlite3.connect(self.db_path) as conn:
+    def _migrate(self):
+        """Apply any schema migrations the database has not seen yet."""
+        with self.pool.connection() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {number}")
+                conn.commit()
+
+    def create_conversation(self, conversation_id: str, user_id: Optional[str] = None) -> None:
+        """Create a new conversation, optionally owned by ``user_id``."""
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
             cursor.execute(
-                "INSERT INTO conversations (conversation_id) VALUES (?)",
-                (conversation_id,)
+                "INSERT INTO conversations (conversation_id, user_id) VALUES (?, ?)",
+                (conversation_id, user_id)
             )
             conn.commit()
 
     def add_message(self, conversation_id: str, role: str, content: str, message_id: str) -> None:
         """Add a new message to a conversation."""
-        with sqlite3.connect(self.db_path) as conn:
+        with latency.measure("db_write"), self.pool.connection() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """INSERT INTO messages (message_id, conversation_id, role, content)
@@ -64,34 +187,176 @@ class DatabaseManager:
             )
             conn.commit()
 
+    def add_messages(
+        self,
+        messages: List[Dict],
+        conversation_ids: Iterable[str] = (),
+        user_ids: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """Insert a batch of messages, and any new conversations, in one transaction.
+
+        ``user_ids`` maps new conversations to the users they belong to.
+        Rows that already exist are skipped, so re-applying a batch after a
+        crash is harmless.
+        """
+        user_ids = user_ids or {}
+        with latency.measure("db_write"), self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                "INSERT OR IGNORE INTO conversations (conversation_id, user_id) VALUES (?, ?)",
+                [(conversation_id, user_ids.get(conversation_id)) for conversation_id in conversation_ids]
+            )
+            cursor.executemany(
+                """INSERT OR IGNORE INTO messages (message_id, conversation_id, role, content)
+                   VALUES (?, ?, ?, ?)""",
+                [(msg["message_id"], msg["conversation_id"], msg["role"], msg["content"]) for msg in messages]
+            )
+            cursor.executemany(
+                """UPDATE conversations
+                   SET last_updated = CURRENT_TIMESTAMP
+                   WHERE conversation_id = ?""",
+                [(conversation_id,) for conversation_id in dict.fromkeys(msg["conversation_id"] for msg in messages)]
+            )
+            conn.commit()
+
     def get_conversation_history(self, conversation_id: str, limit: Optional[int] = None) -> List[Dict]:
-        """Retrieve conversation history."""
-        with sqlite3.connect(self.db_path) as conn:
+        """Retrieve conversation history, oldest first.
+
+        With ``limit`` only the newest ``limit`` messages are returned.
+        """
+        if limit:
+            return self.get_messages_page(conversation_id, limit=limit)["messages"]
+
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
-            query = """
-                SELECT role, content, timestamp 
-                FROM messages 
-                WHERE conversation_id = ? 
-                ORDER BY timestamp ASC
-            """
-            if limit:
-                query += f" LIMIT {limit}"
-            
-            cursor.execute(query, (conversation_id,))
-            messages = cursor.fetchall()
-            
-            return [
-                {
-                    "role": msg[0],
-                    "content": msg[1],
-                    "timestamp": msg[2]
-                }
-                for msg in messages
-            ]
+            cursor.execute(
+                """SELECT message_id, role, content, timestamp
+                   FROM messages
+                   WHERE conversation_id = ?
+                   ORDER BY timestamp ASC, rowid ASC""",
+                (conversation_id,)
+            )
+            return [self._message_row(msg) for msg in cursor.fetchall()]
+
+    def get_messages_page(
+        self,
+        conversation_id: str,
+        limit: int = 50,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+    ) -> Dict:
+        """Keyset-paginated window of a conversation, oldest first.
+
+        Without a cursor this is the newest ``limit`` messages. Pass the
+        returned ``before`` cursor to page further back in time, or ``after``
+        to fetch what was added since. Each page is an index range scan, so
+        its cost does not depend on how long the conversation is.
+        """
+        if before is not None and after is not None:
+            raise ValueError("Pass at most one of 'before' and 'after'")
+
+        query = """
+            SELECT message_id, role, content, timestamp, rowid
+            FROM messages
+            WHERE conversation_id = ?
+        """
+        params: list = [conversation_id]
+        if after is not None:
+            query += " AND (timestamp, rowid) > (?, ?) ORDER BY timestamp ASC, rowid ASC"
+            params.extend(_decode_cursor(after))
+        else:
+            if before is not None:
+                query += " AND (timestamp, rowid) < (?, ?)"
+                params.extend(_decode_cursor(before))
+            query += " ORDER BY timestamp DESC, rowid DESC"
+        query += " LIMIT ?"
+        # Fetch one extra row to learn whether another page exists
+        params.append(limit + 1)
+
+        with self.pool.connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if after is None:
+            rows.reverse()
+
+        return {
+            "messages": [self._message_row(row) for row in rows],
+            "before": _encode_cursor(rows[0][3], rows[0][4]) if rows else before,
+            "after": _encode_cursor(rows[-1][3], rows[-1][4]) if rows else after,
+            "has_more": has_more,
+        }
+
+    @staticmethod
+    def _message_row(row) -> Dict:
+        return {
+            "message_id": row[0],
+            "role": row[1],
+            "content": row[2],
+            "timestamp": row[3]
+        }
+
+    def search_messages(
+        self,
+        query: str,
+        limit: int = 20,
+        conversation_ids: Optional[Iterable[str]] = None,
+    ) -> List[Dict]:
+        """Full-text search over message content, best BM25 match first.
+
+        ``score`` is SQLite's ``bm25()``, where lower (more negative) is a
+        better match. Results can be restricted to a set of conversations;
+        up to ``RETRIEVAL_FTS_SCOPE_LIMIT`` of them are matched inside the
+        FTS index, so a small scope is cheap however large the corpus is.
+        """
+        match = _fts_query(query)
+        if not match:
+            return []
+        match = f"content : ({match})"
+
+        # The conversation key column only narrows the match; weight 0
+        # keeps it out of the ranking
+        sql = """
+            SELECT m.message_id, m.role, m.content, m.timestamp, m.conversation_id, bm25(messages_fts, 1.0, 0.0)
+            FROM messages_fts JOIN messages m ON m.rowid = messages_fts.rowid
+            WHERE messages_fts MATCH ?
+        """
+        params: list = []
+        if conversation_ids is not None:
+            conversation_ids = list(conversation_ids)
+            if not conversation_ids:
+                return []
+            if len(conversation_ids) <= RETRIEVAL_FTS_SCOPE_LIMIT:
+                keys = " OR ".join(_conversation_key(cid) for cid in conversation_ids)
+                match += f" AND conversation_key : ({keys})"
+            # Still checked exactly: distinct ids may share a key
+            sql += f" AND m.conversation_id IN ({', '.join('?' * len(conversation_ids))})"
+            params.extend(conversation_ids)
+        sql += " ORDER BY bm25(messages_fts, 1.0, 0.0) LIMIT ?"
+        params = [match] + params + [limit]
+
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+
+        return [
+            dict(self._message_row(row), conversation_id=row[4], score=row[5])
+            for row in rows
+        ]
+
+    def get_user_conversation_ids(self, user_id: str) -> List[str]:
+        """IDs of every conversation owned by ``user_id``, oldest first."""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT conversation_id FROM conversations WHERE user_id = ? ORDER BY rowid",
+                (user_id,)
+            )
+            return [row[0] for row in cursor.fetchall()]
 
     def get_recent_conversations(self, limit: int = 10) -> List[Dict]:
         """Get recent conversations."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """SELECT conversation_id, created_at, last_updated 
@@ -0,0 +1,62 @@
+import platform
+
+# Supported embedding backends. Every backend runs the same model and the
+# same pooling/normalisation head, so their embeddings are interchangeable
+# and an index built with one can be searched with another.
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx_int8")
+
+# Dynamically quantized exports published alongside the fp32 ONNX model in
+# the sentence-transformers model repos
+_QUANTIZED_FILES = {
+    "arm64": "onnx/model_qint8_arm64.onnx",
+    "aarch64": "onnx/model_qint8_arm64.onnx",
+}
+_DEFAULT_QUANTIZED_FILE = "onnx/model_quint8_avx2.onnx"
+
+
+def onnx_file_for(backend: str) -> str:
+    """The ONNX file inside the model repo that ``backend`` loads."""
+    if backend == "onnx":
+        return "onnx/model.onnx"
+    return _QUANTIZED_FILES.get(platform.machine().lower(), _DEFAULT_QUANTIZED_FILE)
+
+
+def load_model(model_name: str, backend: str = "torch", threads: int = 0, onnx_file: str = ""):
+    """Load a SentenceTransformer for ``model_name`` on ``backend``.
+
+    ``threads`` caps intra-op parallelism (0 keeps the runtime's default,
+    usually one thread per core). The ONNX backends need the optional
+    ``onnx`` extra (onnxruntime and optimum); ``onnx_file`` overrides which
+    export is loaded, e.g. one quantized for a different instruction set.
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {EMBEDDING_BACKENDS}")
+
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return SentenceTransformer(model_name)
+
+    try:
+        import onnxruntime
+    except ImportError as e:
+        raise ImportError(
+            f"The {backend!r} embedding backend needs onnxruntime; "
+            "install it with `pip install vampire-chat[onnx]`"
+        ) from e
+
+    session_options = onnxruntime.SessionOptions()
+    if threads:
+        session_options.intra_op_num_threads = threads
+    return SentenceTransformer(
+        model_name,
+        backend="onnx",
+        model_kwargs={
+            "file_name": onnx_file or onnx_file_for(backend),
+            "provider": "CPUExecutionProvider",
+            "session_options": session_options,
+        },
+    )
@@ -0,0 +1,157 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from queue import Empty, Queue
+from typing import TYPE_CHECKING, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from ..config.settings import (
+    EMBEDDING_BACKEND,
+    EMBEDDING_CACHE_SIZE,
+    EMBEDDING_MAX_BATCH_SIZE,
+    EMBEDDING_MAX_WAIT,
+    EMBEDDING_MODEL,
+    EMBEDDING_ONNX_FILE,
+    EMBEDDING_THREADS,
+)
+from ..utils.timing import latency
+from .embedding_backends import load_model
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+# One model instance per (model, backend) per process, shared by every encoder
+_models: Dict[Tuple[str, str], "SentenceTransformer"] = {}
+_models_lock = threading.Lock()
+
+
+def get_model(model_name: str = EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND) -> "SentenceTransformer":
+    """Return the process-wide SentenceTransformer for ``model_name`` on ``backend``.
+
+    sentence_transformers (and torch or onnxruntime) are only imported here,
+    on first use, so importing this module stays cheap.
+    """
+    with _models_lock:
+        key = (model_name, backend)
+        if key not in _models:
+            _models[key] = load_model(model_name, backend, EMBEDDING_THREADS, EMBEDDING_ONNX_FILE)
+        return _models[key]
+
+
+class EmbeddingEncoder:
+    """Cached, micro-batching front end for SentenceTransformer encoding.
+
+    Embeddings are cached by content hash in a bounded LRU, so text that was
+    just stored is not encoded again when it comes back as a query. Cache
+    misses from concurrent callers are coalesced by a single worker thread
+    into batches of up to ``max_batch_size`` texts, waiting at most
+    ``max_wait`` seconds for a batch to fill.
+
+    The model itself is loaded on first use, so an encoder can be created
+    before (or while) the model loads in the background.
+    """
+
+    def __init__(
+        self,
+        model_name: str = EMBEDDING_MODEL,
+        backend: str = EMBEDDING_BACKEND,
+        cache_size: int = EMBEDDING_CACHE_SIZE,
+        max_batch_size: int = EMBEDDING_MAX_BATCH_SIZE,
+        max_wait: float = EMBEDDING_MAX_WAIT,
+    ):
+        self.model_name = model_name
+        self.backend = backend
+        self.cache_size = cache_size
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.hits = 0
+        self.misses = 0
+
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._queue: Queue = Queue()
+        self._worker = threading.Thread(target=self._run, name="embedding-encoder", daemon=True)
+        self._worker.start()
+
+    @property
+    def model(self) -> "SentenceTransformer":
+        return get_model(self.model_name, self.backend)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def _cache_get(self, key: str):
+        with self._cache_lock:
+            embedding = self._cache.get(key)
+            if embedding is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return embedding
+
+    def _cache_put(self, key: str, embedding: np.ndarray) -> None:
+        with self._cache_lock:
+            self._cache[key] = embedding
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        """Encode ``texts`` into a float32 matrix, one row per text."""
+        rows: List = [None] * len(texts)
+        pending = []
+        for i, text in enumerate(texts):
+            key = self._key(text)
+            embedding = self._cache_get(key)
+            if embedding is not None:
+                rows[i] = embedding
+            else:
+                future = Future()
+                self._queue.put((text, key, future))
+                pending.append((i, future))
+
+        for i, future in pending:
+            rows[i] = future.result()
+
+        if not rows:
+            return np.empty((0, self.get_sentence_embedding_dimension()), dtype="float32")
+        return np.vstack(rows)
+
+    def _run(self) -> None:
+        """Worker loop: gather a micro-batch, encode it, resolve the futures."""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            try:
+                while len(batch) < self.max_batch_size:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+            except Empty:
+                pass
+
+            # Identical texts queued together are encoded once
+            unique: "OrderedDict[str, str]" = OrderedDict()
+            for text, key, _ in batch:
+                unique.setdefault(key, text)
+
+            try:
+                with latency.measure("embedding"):
+                    embeddings = np.asarray(self.model.encode(list(unique.values())), dtype="float32")
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            by_key = dict(zip(unique.keys(), embeddings))
+            for key, embedding in by_key.items():
+                embedding.setflags(write=False)
+                self._cache_put(key, embedding)
+            for _, key, future in batch:
+                future.set_result(by_key[key])
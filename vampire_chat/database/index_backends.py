@@ -0,0 +1,146 @@
+import math
+from typing import Optional
+
+import faiss
+import numpy as np
+
+# Supported index layouts, from exact to most compressed. "fp16" and "sq8"
+# keep every vector in a flat index at 2 and 1 bytes per dimension instead
+# of 4; they are never chosen automatically, only pinned.
+INDEX_KINDS = ("flat", "hnsw", "ivf_flat", "fp16", "sq8", "ivf_pq")
+
+# Layouts whose distances are computed from approximated vectors, so their
+# shortlists are worth re-ranking against the raw vectors
+LOSSY_KINDS = ("fp16", "sq8", "ivf_pq")
+
+_SQ_TYPES = {
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+    "sq8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+
+def choose_kind(ntotal: int, hnsw_at: int, ivf_at: int, ivf_pq_at: int) -> str:
+    """Pick the index layout for a store holding ``ntotal`` vectors."""
+    if ntotal >= ivf_pq_at:
+        return "ivf_pq"
+    if ntotal >= ivf_at:
+        return "ivf_flat"
+    if ntotal >= hnsw_at:
+        return "hnsw"
+    return "flat"
+
+
+def nlist_for(ntotal: int) -> int:
+    """Number of IVF cells for ``ntotal`` vectors (the usual 4 * sqrt(n))."""
+    return int(min(65536, max(16, 4 * math.sqrt(max(ntotal, 1)))))
+
+
+def pq_subquantizers(dim: int, preferred: int) -> int:
+    """Largest divisor of ``dim`` not above ``preferred``, as PQ requires."""
+    for m in range(min(preferred, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def can_train(kind: str, ntotal: int) -> bool:
+    """Whether ``ntotal`` vectors are enough to train an index of ``kind``.
+
+    FAISS wants roughly 39 training points per k-means centroid; IVF-PQ
+    additionally trains 256-entry codebooks per sub-quantizer. SQ8 only
+    learns per-dimension ranges, but from too few points those ranges
+    clip later vectors.
+    """
+    if kind == "sq8":
+        return ntotal >= 1_000
+    if kind == "ivf_flat":
+        return ntotal >= 39 * nlist_for(ntotal)
+    if kind == "ivf_pq":
+        return ntotal >= 39 * max(nlist_for(ntotal), 256)
+    return True
+
+
+def build_index(kind: str, dim: int, ntotal: int = 0, hnsw_m: int = 32, pq_m: int = 16) -> faiss.Index:
+    """Create an empty index of the given kind sized for ``ntotal`` vectors."""
+    if kind == "flat":
+        return faiss.IndexFlatL2(dim)
+    if kind == "hnsw":
+        return faiss.IndexHNSWFlat(dim, hnsw_m)
+    if kind == "ivf_flat":
+        quantizer = faiss.IndexFlatL2(dim)
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist_for(ntotal))
+        index.own_fields = True
+        quantizer.this.disown()
+        return index
+    if kind == "ivf_pq":
+        quantizer = faiss.IndexFlatL2(dim)
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist_for(ntotal), pq_subquantizers(dim, pq_m), 8)
+        index.own_fields = True
+        quantizer.this.disown()
+        return index
+    if kind in _SQ_TYPES:
+        return faiss.IndexScalarQuantizer(dim, _SQ_TYPES[kind], faiss.METRIC_L2)
+    raise ValueError(f"Unknown index kind {kind!r}, expected one of {INDEX_KINDS}")
+
+
+def detect_kind(index: faiss.Index) -> str:
+    """Report which of ``INDEX_KINDS`` an index (as read from disk) is."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        for kind, qtype in _SQ_TYPES.items():
+            if index.sq.qtype == qtype:
+                return kind
+    return "flat"
+
+
+def training_sample(index: faiss.Index, vectors: np.ndarray, max_training_points: int = 256) -> np.ndarray:
+    """Random rows of ``vectors`` (which may be a memory map) to train ``index`` on.
+
+    ``max_training_points`` is per IVF cell; FAISS itself samples down to
+    256 points per centroid, so training on more only costs time. Scalar
+    quantizers are trained as if they had 256 cells. Only the sampled rows
+    are read into memory.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    limit = max_training_points * (ivf.nlist if ivf is not None else 256)
+    if len(vectors) > limit:
+        sample = np.random.default_rng(0).choice(len(vectors), limit, replace=False)
+        vectors = vectors[np.sort(sample)]
+    return np.ascontiguousarray(vectors, dtype='float32')
+
+
+def train_index(index: faiss.Index, vectors: np.ndarray, max_training_points: int = 256) -> None:
+    """Train an IVF or SQ8 index on a random sample of ``vectors``."""
+    if index.is_trained:
+        return
+    index.train(training_sample(index, vectors, max_training_points))
+
+
+def search_params(
+    index: faiss.Index,
+    selector: faiss.IDSelector,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+) -> faiss.SearchParameters:
+    """Per-query search parameters restricting results to ``selector``."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=nprobe or index.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search or index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def set_search_params(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> None:
+    """Apply recall/latency knobs to whichever index layout is in use."""
+    index = faiss.downcast_index(index)
+    if nprobe is not None and isinstance(index, faiss.IndexIVF):
+        index.nprobe = nprobe
+    if ef_search is not None and isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
@@ -0,0 +1,159 @@
+import mmap
+import os
+import struct
+import threading
+from typing import Dict, Iterator, Optional, Tuple
+
+# Columns stored for every message, in row order
+FIELDS = ("id", "conversation_id", "role", "content", "timestamp")
+
+# Each row holds an (offset, length) pair into the string heap per field
+_ROW = struct.Struct("<" + "QI" * len(FIELDS))
+# Length marker for fields that are None
+_NULL = 0xFFFFFFFF
+
+
+class MetadataStore:
+    """Append-only, memory-mapped store for message metadata.
+
+    Metadata lives in two files: ``<path>.rows`` holds one fixed-width row of
+    heap offsets per message and ``<path>.heap`` holds the UTF-8 strings.
+    Both are opened through ``mmap``, so looking up a search hit costs O(1)
+    and only the pages that are actually read become resident.
+
+    Reads are safe from several threads at once; appends must not run
+    concurrently with reads or with each other.
+    """
+
+    def __init__(self, path: str):
+        self.rows_path = f"{path}.rows"
+        self.heap_path = f"{path}.heap"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        self._rows_file = open(self.rows_path, "ab+")
+        self._heap_file = open(self.heap_path, "ab+")
+        self._rows_map: Optional[mmap.mmap] = None
+        self._heap_map: Optional[mmap.mmap] = None
+        self._heap_size = os.path.getsize(self.heap_path)
+        self._remap_lock = threading.Lock()
+        self._count = self._recover()
+
+    def _recover(self) -> int:
+        """Drop partially written rows left behind by a crash."""
+        size = os.path.getsize(self.rows_path)
+        count = size // _ROW.size
+
+        # The heap is written before its row, so a row pointing past the end
+        # of the heap was never completed
+        while count:
+            self._rows_file.seek((count - 1) * _ROW.size)
+            row = _ROW.unpack(self._rows_file.read(_ROW.size))
+            if all(length == _NULL or offset + length <= self._heap_size
+                   for offset, length in zip(row[::2], row[1::2])):
+                break
+            count -= 1
+
+        if count * _ROW.size != size:
+            self._rows_file.truncate(count * _ROW.size)
+        return count
+
+    def _remap(self) -> None:
+        """Re-create the read-only maps after the files have grown.
+
+        Replaced maps are not closed here: another reader may still be using
+        them, and they are released once the last reference goes away.
+        """
+        with self._remap_lock:
+            self._rows_file.flush()
+            self._heap_file.flush()
+            self._rows_map = self._map(self._rows_file)
+            self._heap_map = self._map(self._heap_file)
+
+    @staticmethod
+    def _map(f) -> Optional[mmap.mmap]:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _row(self, idx: int):
+        if not 0 <= idx < self._count:
+            raise IndexError(f"metadata row {idx} out of range")
+        end = (idx + 1) * _ROW.size
+        mapped = self._rows_map
+        if mapped is None or len(mapped) < end:
+            self._remap()
+            mapped = self._rows_map
+        return _ROW.unpack_from(mapped, idx * _ROW.size)
+
+    def _string(self, offset: int, length: int) -> Optional[str]:
+        if length == _NULL:
+            return None
+        mapped = self._heap_map
+        if mapped is None or len(mapped) < offset + length:
+            self._remap()
+            mapped = self._heap_map
+        return mapped[offset:offset + length].decode("utf-8")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, idx: int) -> Dict:
+        row = self._row(idx)
+        return {
+            field: self._string(row[2 * i], row[2 * i + 1])
+            for i, field in enumerate(FIELDS)
+        }
+
+    def __iter__(self) -> Iterator[Dict]:
+        for idx in range(self._count):
+            yield self[idx]
+
+    def get_field(self, idx: int, field: str) -> Optional[str]:
+        """Read a single column of a row without decoding the others."""
+        i = FIELDS.index(field)
+        row = self._row(idx)
+        return self._string(row[2 * i], row[2 * i + 1])
+
+    def iter_fields(self, *fields: str, start: int = 0) -> Iterator[Tuple[Optional[str], ...]]:
+        """Yield the requested columns for every row from ``start`` on, in row order."""
+        columns = [FIELDS.index(field) for field in fields]
+        for idx in range(start, self._count):
+            row = self._row(idx)
+            yield tuple(self._string(row[2 * i], row[2 * i + 1]) for i in columns)
+
+    def append(self, metadata: Dict) -> int:
+        """Append a row and return its position."""
+        row = []
+        heap = bytearray()
+        for field in FIELDS:
+            value = metadata.get(field)
+            if value is None:
+                row.extend((0, _NULL))
+                continue
+            data = str(value).encode("utf-8")
+            row.extend((self._heap_size + len(heap), len(data)))
+            heap += data
+
+        self._heap_file.write(heap)
+        self._rows_file.write(_ROW.pack(*row))
+        self._heap_size += len(heap)
+        self._count += 1
+        return self._count - 1
+
+    def flush(self, fsync: bool = False) -> None:
+        """Flush pending writes, optionally forcing them to stable storage."""
+        self._heap_file.flush()
+        self._rows_file.flush()
+        if fsync:
+            os.fsync(self._heap_file.fileno())
+            os.fsync(self._rows_file.fileno())
+
+    def close(self) -> None:
+        """Release the maps and the underlying files."""
+        for mapped in (self._rows_map, self._heap_map):
+            if mapped is not None:
+                mapped.close()
+        self._rows_map = self._heap_map = None
+        for f in (self._rows_file, self._heap_file):
+            if not f.closed:
+                f.close()
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .metadata_store import MetadataStore
+
+# One fixed-width entry per vector store row: a hash of the message id and
+# the codes of its conversation and role (-1 for None)
+_ENTRY = np.dtype([("id_hash", "<u8"), ("conversation", "<i4"), ("role", "<i4")])
+_NONE = -1
+
+# Kinds of interned strings in the keys file
+_CONVERSATION, _ROLE = "c", "r"
+
+
+def id_hash(message_id: str) -> int:
+    """64-bit hash of a message id; 0 is reserved for rows without one."""
+    digest = hashlib.blake2b(message_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1
+
+
+class ScopeIndex:
+    """Compact lookups from conversation, role and message id to store rows.
+
+    Every row gets a 16-byte entry in ``<path>.scope``: a hash of its
+    message id and integer codes for its conversation and role, whose
+    strings are interned once each in ``<path>.keys``. The entries are
+    loaded into numpy arrays, so a million rows take about 30 MiB including
+    the sorted copies used for lookups, and reopening a store reads them
+    back instead of decoding every metadata row.
+
+    Rows are found by binary search over the columns sorted at the last
+    ``_sort`` plus a linear scan of the rows appended since; the tail is
+    re-sorted once it grows past a sixteenth of the store. Like
+    ``MetadataStore``, reads may run concurrently but appends may not.
+    """
+
+    def __init__(self, path: str, min_tail: int = 4096):
+        self.scope_path = f"{path}.scope"
+        self.keys_path = f"{path}.keys"
+        self.min_tail = min_tail
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        # kind -> string -> code
+        self._codes: Dict[str, Dict[str, int]] = {_CONVERSATION: {}, _ROLE: {}}
+        self._load_keys()
+        self._entries = self._load_entries()
+        self._count = len(self._entries)
+        self._scope_file = open(self.scope_path, "ab")
+        self._sort()
+
+    def _load_keys(self) -> None:
+        valid_end = 0
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path, "rb") as f:
+                for line in f:
+                    try:
+                        kind, value = json.loads(line)
+                    except ValueError:
+                        break  # torn by a crash
+                    codes = self._codes[kind]
+                    codes[value] = len(codes)
+                    valid_end += len(line)
+        self._keys_file = open(self.keys_path, "ab")
+        if valid_end < os.path.getsize(self.keys_path):
+            self._keys_file.truncate(valid_end)
+
+    def _load_entries(self) -> np.ndarray:
+        """Read the entries back, dropping any torn or unresolvable tail."""
+        if not os.path.exists(self.scope_path):
+            return np.empty(0, dtype=_ENTRY)
+        count = os.path.getsize(self.scope_path) // _ENTRY.itemsize
+        entries = np.fromfile(self.scope_path, dtype=_ENTRY, count=count)
+        # Entries and keys are flushed separately, so after a crash an entry
+        # may name a code whose key never reached the disk
+        bad = np.flatnonzero(
+            (entries["conversation"] >= len(self._codes[_CONVERSATION]))
+            | (entries["role"] >= len(self._codes[_ROLE]))
+        )
+        count = int(bad[0]) if len(bad) else count
+        if count * _ENTRY.itemsize != os.path.getsize(self.scope_path):
+            os.truncate(self.scope_path, count * _ENTRY.itemsize)
+        return entries[:count].copy()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _code(self, kind: str, value: Optional[str], new_keys: List[bytes]) -> int:
+        if value is None:
+            return _NONE
+        codes = self._codes[kind]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+            new_keys.append(json.dumps([kind, value]).encode("utf-8") + b"\n")
+        return code
+
+    def append(self, metadatas: Iterable[Dict]) -> None:
+        """Add entries for the next rows, in row order."""
+        new_keys: List[bytes] = []
+        entries = np.array([
+            (
+                id_hash(metadata["id"]) if metadata.get("id") is not None else 0,
+                self._code(_CONVERSATION, metadata.get("conversation_id"), new_keys),
+                self._code(_ROLE, metadata.get("role"), new_keys),
+            )
+            for metadata in metadatas
+        ], dtype=_ENTRY)
+        if new_keys:
+            self._keys_file.write(b"".join(new_keys))
+        self._scope_file.write(entries.tobytes())
+
+        end = self._count + len(entries)
+        if end > len(self._entries):
+            grown = np.empty(max(end, 2 * len(self._entries), 1024), dtype=_ENTRY)
+            grown[:self._count] = self._entries[:self._count]
+            self._entries = grown
+        self._entries[self._count:end] = entries
+        self._count = end
+        if self._count - self._sorted > max(self.min_tail, self._count // 16):
+            self._sort()
+
+    def sync(self, messages: MetadataStore) -> None:
+        """Match the rows of ``messages``: drop extra entries, index missing ones."""
+        if self._count > len(messages):
+            self._count = len(messages)
+            self._scope_file.flush()
+            self._scope_file.truncate(self._count * _ENTRY.itemsize)
+            self._sort()
+        elif self._count < len(messages):
+            fields = ("id", "conversation_id", "role")
+            self.append(
+                dict(zip(fields, values)) for values in messages.iter_fields(*fields, start=self._count)
+            )
+            self._sort()
+
+    def _sort(self) -> None:
+        entries = self._entries[:self._count]
+        self._by_conversation = np.argsort(entries["conversation"], kind="stable")
+        self._conversations_sorted = entries["conversation"][self._by_conversation]
+        self._by_id = np.argsort(entries["id_hash"], kind="stable")
+        self._ids_sorted = entries["id_hash"][self._by_id]
+        self._sorted = self._count
+
+    def rows_for_conversations(self, conversation_ids: Iterable[str]) -> np.ndarray:
+        """Sorted rows of the given conversations."""
+        codes = self._codes[_CONVERSATION]
+        wanted = np.unique(np.array(
+            [codes[cid] for cid in conversation_ids if cid in codes], dtype="int32"
+        ))
+        if not len(wanted):
+            return np.empty(0, dtype="int64")
+        starts = np.searchsorted(self._conversations_sorted, wanted, side="left")
+        stops = np.searchsorted(self._conversations_sorted, wanted, side="right")
+        parts = [self._by_conversation[start:stop] for start, stop in zip(starts, stops)]
+        tail = self._entries["conversation"][self._sorted:self._count]
+        parts.append(self._sorted + np.flatnonzero(np.isin(tail, wanted)))
+        return np.sort(np.concatenate(parts)).astype("int64")
+
+    def role_mask(self, role: str, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Boolean mask of ``rows`` (default: every row) that have ``role``."""
+        roles = self._entries["role"][:self._count]
+        code = self._codes[_ROLE].get(role)
+        if rows is not None:
+            roles = roles[rows]
+        if code is None:
+            return np.zeros(len(roles), dtype=bool)
+        return roles == code
+
+    def rows_for_id(self, message_id: str) -> np.ndarray:
+        """Rows whose message id hashes like ``message_id``; callers confirm the match."""
+        key = np.uint64(id_hash(message_id))
+        start = np.searchsorted(self._ids_sorted, key, side="left")
+        stop = np.searchsorted(self._ids_sorted, key, side="right")
+        tail = self._entries["id_hash"][self._sorted:self._count]
+        return np.concatenate([self._by_id[start:stop], self._sorted + np.flatnonzero(tail == key)])
+
+    def flush(self, fsync: bool = False) -> None:
+        """Flush pending writes, optionally forcing them to stable storage."""
+        for f in (self._keys_file, self._scope_file):
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+
+    def close(self) -> None:
+        """Close the underlying files."""
+        for f in (self._keys_file, self._scope_file):
+            if not f.closed:
+                f.close()
@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+
+
+class VectorFile:
+    """Append-only float32 matrix on disk, read back through ``numpy.memmap``.
+
+    The FAISS index may hold vectors in a lossy or non-reconstructable form,
+    so the raw embeddings are kept here for training and rebuilding indexes.
+    Like ``MetadataStore``, reads may run concurrently but appends may not.
+    """
+
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.dim = dim
+        self.row_size = dim * 4
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        self._file = open(path, "ab")
+        # Drop a partially written trailing row left behind by a crash
+        size = os.path.getsize(path)
+        self._count = size // self.row_size
+        if self._count * self.row_size != size:
+            self._file.truncate(self._count * self.row_size)
+        self._map = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, vectors: np.ndarray) -> int:
+        """Append rows and return the position of the first one."""
+        vectors = np.ascontiguousarray(vectors, dtype="float32").reshape(-1, self.dim)
+        self._file.write(vectors.tobytes())
+        start = self._count
+        self._count += len(vectors)
+        return start
+
+    def read(self, start: int = 0, stop: int = None) -> np.ndarray:
+        """Return rows ``[start, stop)`` as an in-memory array."""
+        stop = self._count if stop is None else min(stop, self._count)
+        if start >= stop:
+            return np.empty((0, self.dim), dtype="float32")
+        return np.array(self._ensure_mapped(stop)[start:stop])
+
+    def view(self, stop: int = None) -> np.ndarray:
+        """Return rows ``[0, stop)`` as a read-only map, without copying them."""
+        stop = self._count if stop is None else min(stop, self._count)
+        if stop == 0:
+            return np.empty((0, self.dim), dtype="float32")
+        return self._ensure_mapped(stop)[:stop]
+
+    def take(self, rows: np.ndarray) -> np.ndarray:
+        """Return the given (sorted) rows as an in-memory array."""
+        if len(rows) == 0:
+            return np.empty((0, self.dim), dtype="float32")
+        return np.asarray(self._ensure_mapped(int(rows[-1]) + 1)[rows])
+
+    def _ensure_mapped(self, stop: int) -> np.memmap:
+        mapped = self._map
+        if mapped is None or len(mapped) < stop:
+            self._file.flush()
+            mapped = np.memmap(self.path, dtype="float32", mode="r", shape=(self._count, self.dim))
+            self._map = mapped
+        return mapped
+
+    def flush(self, fsync: bool = False) -> None:
+        """Flush pending writes, optionally forcing them to stable storage."""
+        self._file.flush()
+        if fsync:
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        """Release the map and the underlying file."""
+        self._map = None
+        if not self._file.closed:
+            self._file.close()
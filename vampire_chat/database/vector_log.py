@@ -0,0 +1,95 @@
+import json
+import os
+import struct
+import zlib
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+# Each record is: payload length, crc32 of payload, sequence number
+_HEADER = struct.Struct("<IIq")
+# Payload starts with the embedding dimension, followed by the float32
+# embedding and the UTF-8 encoded JSON metadata
+_DIM = struct.Struct("<I")
+
+
+class VectorLog:
+    """Append-only log of embeddings and metadata written between checkpoints.
+
+    Every record carries the position (sequence number) the message takes in
+    the vector store, so replaying a log on top of a checkpoint that already
+    contains some of its records is harmless.
+    """
+
+    def __init__(self, path: str, fsync: bool = False):
+        self.path = path
+        self.fsync = fsync
+        self.records = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "ab")
+
+    def append(self, seq: int, embedding: np.ndarray, metadata: Dict) -> None:
+        """Append one record; cost does not depend on the size of the store."""
+        self.append_many(seq, np.reshape(embedding, (1, -1)), [metadata])
+
+    def append_many(self, first_seq: int, embeddings: np.ndarray, metadatas: List[Dict]) -> None:
+        """Append consecutive records with a single write and (optional) fsync."""
+        vectors = np.ascontiguousarray(embeddings, dtype="float32").reshape(len(metadatas), -1)
+        records = bytearray()
+        for offset, (vector, metadata) in enumerate(zip(vectors, metadatas)):
+            payload = (
+                _DIM.pack(vector.shape[0])
+                + vector.tobytes()
+                + json.dumps(metadata).encode("utf-8")
+            )
+            records += _HEADER.pack(len(payload), zlib.crc32(payload), first_seq + offset)
+            records += payload
+        self._file.write(records)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.records += len(metadatas)
+
+    def replay(self) -> Iterator[Tuple[int, np.ndarray, Dict]]:
+        """Yield ``(seq, embedding, metadata)`` for every intact record.
+
+        Reading stops at the first torn or corrupt record (e.g. a write
+        interrupted by a crash) and the file is truncated there, so later
+        appends never follow garbage.
+        """
+        valid_end = 0
+        self.records = 0
+        with open(self.path, "rb") as f:
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                length, crc, seq = _HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+
+                (dim,) = _DIM.unpack_from(payload)
+                vector_end = _DIM.size + dim * 4
+                embedding = np.frombuffer(payload[_DIM.size:vector_end], dtype="float32")
+                metadata = json.loads(payload[vector_end:].decode("utf-8"))
+
+                valid_end = f.tell()
+                self.records += 1
+                yield seq, embedding, metadata
+
+        if valid_end < os.path.getsize(self.path):
+            self._file.truncate(valid_end)
+
+    def truncate(self) -> None:
+        """Discard all records once they are covered by a checkpoint."""
+        self._file.truncate(0)
+        self._file.seek(0)
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.records = 0
+
+    def close(self) -> None:
+        """Close the underlying file."""
+        if not self._file.closed:
+            self._file.close()
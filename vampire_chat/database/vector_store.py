@@ -1,84 +1,539 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterable, Optional, Tuple, Union
+import atexit
+from concurrent.futures import Future
 import numpy as np
 from datetime import datetime
 import faiss
-from sentence_transformers import SentenceTransformer
 import json
 import os
+from queue import Empty, Queue
+import threading
+
+from ..config.settings import (
+    EMBEDDING_MODEL,
+    VECTOR_CHECKPOINT_FRACTION,
+    VECTOR_CHECKPOINT_INTERVAL,
+    VECTOR_EF_SEARCH,
+    VECTOR_EXACT_SCAN_LIMIT,
+    VECTOR_HNSW_M,
+    VECTOR_INDEX_KIND,
+    VECTOR_LOG_FSYNC,
+    VECTOR_NPROBE,
+    VECTOR_PQ_M,
+    VECTOR_PROMOTE_HNSW_AT,
+    VECTOR_PROMOTE_IVF_AT,
+    VECTOR_PROMOTE_IVF_PQ_AT,
+    VECTOR_REBUILD_CHUNK,
+    VECTOR_RERANK,
+    VECTOR_WRITE_BATCH_SIZE,
+)
+from ..utils.rwlock import RWLock
+from ..utils.timing import latency
+from .encoder import EmbeddingEncoder
+from .index_backends import (
+    LOSSY_KINDS,
+    build_index,
+    can_train,
+    choose_kind,
+    detect_kind,
+    search_params,
+    set_search_params,
+    train_index,
+    training_sample,
+)
+from .metadata_store import MetadataStore
+from .scope_index import ScopeIndex
+from .vector_file import VectorFile
+from .vector_log import VectorLog
 
 class VectorStore:
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
-        self.model = SentenceTransformer(model_name)
+    """FAISS-backed store of message embeddings and their metadata.
+
+    Searches run concurrently under the read side of ``_rw``. All mutations
+    go through a single writer thread that drains appends queued by any
+    number of callers and applies them as one batch under the write side,
+    so readers only ever see whole batches and wait for at most one
+    ``index.add`` at a time. ``_lock`` serializes the writer with
+    checkpoints and index rebuilds.
+
+    The raw float32 embeddings stay on disk (``vectors``) whatever the index
+    layout, so compact layouts such as ``sq8`` can serve searches from
+    codes a quarter of the size and still return exact distances: their
+    shortlist of ``k * rerank`` hits is re-ranked against the raw vectors.
+    """
+
+    def __init__(
+        self,
+        model_name: str = EMBEDDING_MODEL,
+        index_path: str = "vampire_chat/database/vector_index",
+        messages_path: str = "vampire_chat/database/vector_messages.json",
+        metadata_path: str = "vampire_chat/database/vector_metadata",
+        log_path: Optional[str] = None,
+        checkpoint_interval: int = VECTOR_CHECKPOINT_INTERVAL,
+        checkpoint_fraction: float = VECTOR_CHECKPOINT_FRACTION,
+        index_kind: str = VECTOR_INDEX_KIND,
+        nprobe: int = VECTOR_NPROBE,
+        ef_search: int = VECTOR_EF_SEARCH,
+        write_batch_size: int = VECTOR_WRITE_BATCH_SIZE,
+        rerank: int = VECTOR_RERANK,
+    ):
+        self.encoder = EmbeddingEncoder(model_name)
         self.index = None
-        self.messages = []
-        self.index_path = "vampire_chat/database/vector_index"
-        self.messages_path = "vampire_chat/database/vector_messages.json"
+        self.vectors = None
+        self.messages = MetadataStore(metadata_path)
+        self.scopes = ScopeIndex(metadata_path)
+        self.index_path = index_path
+        self.messages_path = messages_path
+        self.log_path = log_path or f"{index_path}.log"
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_fraction = checkpoint_fraction
+        self.log = VectorLog(self.log_path, fsync=VECTOR_LOG_FSYNC)
+        self.index_kind = index_kind
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.write_batch_size = write_batch_size
+        self.rerank = rerank
+        self._lock = threading.RLock()
+        self._rw = RWLock()
+        self._rebuild_thread = None
+        self._closed = False
+        self._writes: Queue = Queue()
+        self._writes_lock = threading.Lock()
+        # Row positions double as stable message ids: every store is
+        # append-only and indexes are always filled in row order, so FAISS
+        # ids never need remapping
         self._load_or_create_index()
+        self._writer = threading.Thread(target=self._run_writer, name="vector-store-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
 
     def _load_or_create_index(self):
-        """Load existing index or create a new one."""
-        if os.path.exists(self.index_path) and os.path.exists(self.messages_path):
+        """Load the last checkpoint (or create a new index) and replay the log."""
+        if os.path.exists(self.index_path):
             self.index = faiss.read_index(self.index_path)
-            with open(self.messages_path, 'r') as f:
-                self.messages = json.load(f)
+            self._import_legacy_messages()
         else:
             # Initialize a new index
-            embedding_dim = self.model.get_sentence_embedding_dimension()
+            embedding_dim = self.encoder.get_sentence_embedding_dimension()
             self.index = faiss.IndexFlatL2(embedding_dim)
-            self.messages = []
+        self.vectors = VectorFile(f"{self.index_path}.vectors", self.index.d)
+        self._backfill_vectors()
+        self._replay_log()
+        self.scopes.sync(self.messages)
+        set_search_params(self.index, self.nprobe, self.ef_search)
+        self._maybe_promote()
+
+    def _import_legacy_messages(self):
+        """One-off import of metadata saved by older versions as a JSON list."""
+        if len(self.messages) or not os.path.exists(self.messages_path):
+            return
+        with open(self.messages_path, 'r') as f:
+            for metadata in json.load(f):
+                self.messages.append(metadata)
+        self.messages.flush(fsync=True)
+
+    def _backfill_vectors(self):
+        """Recover raw vectors for indexes saved before they were kept on disk."""
+        missing = self.index.ntotal - len(self.vectors)
+        if missing <= 0:
+            return
+        try:
+            self.vectors.append(self.index.reconstruct_n(len(self.vectors), missing))
+        except RuntimeError:
+            # Compressed layouts cannot give their vectors back; the store
+            # keeps working but cannot be re-indexed until it is rebuilt
+            pass
+
+    def _replay_log(self):
+        """Re-apply records appended since the last checkpoint."""
+        # Rows missing from the index are added in one call at the end
+        unindexed = []
+        for seq, embedding, metadata in self.log.replay():
+            indexed = self.index.ntotal + len(unindexed)
+            # The index and metadata are checkpointed separately, so either
+            # may already hold a record that the other is still missing
+            if seq > len(self.messages) or seq > indexed:
+                break
+            if seq == len(self.messages):
+                self.messages.append(metadata)
+            if seq == indexed:
+                unindexed.append(embedding)
+            if seq == len(self.vectors):
+                self.vectors.append(embedding)
+        if unindexed:
+            self.index.add(np.vstack(unindexed))
 
     def _save_index(self):
-        """Save the current index and messages to disk."""
-        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
-        faiss.write_index(self.index, self.index_path)
-        with open(self.messages_path, 'w') as f:
-            json.dump(self.messages, f)
+        """Atomically save the current index to disk."""
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        faiss.write_index(self.index, f"{self.index_path}.tmp")
+        os.replace(f"{self.index_path}.tmp", self.index_path)
+
+    def checkpoint(self):
+        """Fold the append-only log into the FAISS file."""
+        with self._lock:
+            # Rows must be durable before the log that backs them goes
+            self.messages.flush(fsync=True)
+            self.vectors.flush(fsync=True)
+            self.scopes.flush(fsync=True)
+            self._save_index()
+            self.log.truncate()
+
+    def _checkpoint_due(self) -> bool:
+        """Fold the log in once it is a fixed share of the index.
+
+        Rewriting the index costs O(ntotal), so checkpointing every
+        ``checkpoint_interval`` records alone would make the write cost per
+        message grow with the store; waiting until the log also holds
+        ``checkpoint_fraction`` of the index keeps it constant, while a
+        restart still replays at most that share of the index.
+        """
+        threshold = max(self.checkpoint_interval, self.checkpoint_fraction * self.index.ntotal)
+        return self.log.records >= threshold
+
+    def close(self):
+        """Stop the writer, checkpoint pending log records and release the open files."""
+        with self._writes_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._writes.put(None)
+        self._writer.join()
+        with self._lock:
+            if self.log.records:
+                self.checkpoint()
+            with self._rw.write():
+                self.log.close()
+                self.messages.close()
+                self.scopes.close()
+                self.vectors.close()
+
+    def set_search_params(
+        self,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        rerank: Optional[int] = None,
+    ):
+        """Tune recall against latency for IVF (``nprobe``), HNSW (``ef_search``)
+        and lossy layouts (``rerank`` shortlist factor, 0 to disable)."""
+        with self._lock, self._rw.write():
+            if nprobe is not None:
+                self.nprobe = nprobe
+            if ef_search is not None:
+                self.ef_search = ef_search
+            if rerank is not None:
+                self.rerank = rerank
+            set_search_params(self.index, self.nprobe, self.ef_search)
+
+    def _target_kind(self) -> str:
+        """Index layout the store should be using at its current size."""
+        if self.index_kind != "auto":
+            return self.index_kind
+        return choose_kind(
+            self.index.ntotal,
+            VECTOR_PROMOTE_HNSW_AT,
+            VECTOR_PROMOTE_IVF_AT,
+            VECTOR_PROMOTE_IVF_PQ_AT,
+        )
+
+    def _maybe_promote(self):
+        """Start a background rebuild once the store outgrows its index layout."""
+        with self._lock:
+            target = self._target_kind()
+            if target == detect_kind(self.index) or self._rebuild_thread is not None:
+                return
+            if len(self.vectors) < self.index.ntotal:
+                return  # raw vectors are missing, nothing to rebuild from
+            if not can_train(target, self.index.ntotal):
+                return
+            self._rebuild_thread = threading.Thread(
+                target=self._rebuild, args=(target,), name="vector-index-rebuild", daemon=True
+            )
+            self._rebuild_thread.start()
+
+    def _rebuild(self, kind: str):
+        """Train and fill a new index off the request path, then swap it in.
+
+        The raw vectors are never loaded as a whole: training reads a sample
+        of rows from the memory map and the index is filled in chunks of
+        ``VECTOR_REBUILD_CHUNK`` rows, so memory stays bounded by the new
+        index itself.
+        """
+        try:
+            with self._rw.read():
+                count = len(self.vectors)
+                index = build_index(kind, self.vectors.dim, count, VECTOR_HNSW_M, VECTOR_PQ_M)
+                # 64 points per IVF cell is plenty for k-means and keeps the
+                # training sample to a fraction of the corpus
+                sample = training_sample(index, self.vectors.view(count), max_training_points=64)
+            train_index(index, sample)
+            del sample
+            for start in range(0, count, VECTOR_REBUILD_CHUNK):
+                with self._rw.read():
+                    chunk = self.vectors.read(start, min(start + VECTOR_REBUILD_CHUNK, count))
+                index.add(chunk)
+
+            with self._lock:
+                if self._closed:
+                    return
+                # Catch up on messages added while the new index was built
+                index.add(self.vectors.read(count))
+                set_search_params(index, self.nprobe, self.ef_search)
+                with self._rw.write():
+                    self.index = index
+                self.checkpoint()
+        finally:
+            self._rebuild_thread = None
 
     def add_message(self, message: Dict):
         """Add a new message to the vector store."""
-        # Create embedding for the message content
-        embedding = self.model.encode([message["content"]])[0]
-        
-        # Add to FAISS index
-        self.index.add(np.array([embedding]).astype('float32'))
-        
-        # Store message with metadata
-        self.messages.append({
-            "id": message.get("message_id"),
-            "conversation_id": message.get("conversation_id"),
-            "role": message.get("role"),
-            "content": message.get("content"),
-            "timestamp": message.get("timestamp", str(datetime.now()))
-        })
+        self.add_messages([message])
+
+    def add_messages(self, messages: List[Dict]) -> List[int]:
+        """Add messages to the vector store and return their row ids.
+
+        Embeddings are computed on the calling thread; the rows are then
+        applied by the writer thread together with whatever other callers
+        queued meanwhile. Returns once the messages are searchable.
+        """
+        if not messages:
+            return []
+
+        # Create embeddings for the message contents
+        embeddings = np.asarray(self.encoder.encode([m["content"] for m in messages]), dtype='float32')
         
-        # Save to disk
-        self._save_index()
+        # Store messages with metadata
+        metadatas = [
+            {
+                "id": message.get("message_id"),
+                "conversation_id": message.get("conversation_id"),
+                "role": message.get("role"),
+                "content": message.get("content"),
+                "timestamp": message.get("timestamp", str(datetime.now()))
+            }
+            for message in messages
+        ]
 
-    def search_similar_messages(self, query: str, k: int = 5) -> List[Dict]:
-        """Search for similar messages using the query."""
+        future = Future()
+        with self._writes_lock:
+            if self._closed:
+                raise RuntimeError("vector store is closed")
+            self._writes.put((embeddings, metadatas, future))
+        return future.result()
+
+    def _run_writer(self):
+        """Writer loop: drain queued appends and apply them as one batch."""
+        stopping = False
+        while not stopping:
+            item = self._writes.get()
+            if item is None:
+                break
+            batch = [item]
+            size = len(item[1])
+            while size < self.write_batch_size:
+                try:
+                    item = self._writes.get_nowait()
+                except Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                size += len(item[1])
+            self._apply_batch(batch)
+
+    def _apply_batch(self, batch: List[Tuple[np.ndarray, List[Dict], Future]]):
+        embeddings = np.vstack([embeddings for embeddings, _, _ in batch])
+        metadatas = [metadata for _, items, _ in batch for metadata in items]
+        try:
+            with latency.measure("vector_write"), self._lock:
+                start = len(self.messages)
+                # Write ahead to the log, then apply
+                self.log.append_many(start, embeddings, metadatas)
+                with self._rw.write():
+                    self.index.add(embeddings)
+                    self.vectors.append(embeddings)
+                    for metadata in metadatas:
+                        self.messages.append(metadata)
+                    self.scopes.append(metadatas)
+
+                if self._checkpoint_due():
+                    self.checkpoint()
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        for _, items, future in batch:
+            future.set_result(list(range(start, start + len(items))))
+            start += len(items)
+
+        self._maybe_promote()
+
+    def _row_of(self, message_id: str) -> Optional[int]:
+        """Row of a message id; callers hold the read lock."""
+        for row in self.scopes.rows_for_id(message_id):
+            if self.messages.get_field(int(row), "id") == message_id:
+                return int(row)
+        return None
+
+    def row_for(self, message_id: str) -> Optional[int]:
+        """Return the stable row id of a message, or None if it is not stored."""
+        with self._rw.read():
+            return self._row_of(message_id)
+
+    def get_embeddings(self, message_ids: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Raw embeddings of stored messages by message id; unknown ids are skipped."""
+        with self._rw.read():
+            found = {}
+            for message_id in message_ids:
+                row = self._row_of(message_id)
+                if row is not None and row < len(self.vectors):
+                    found[message_id] = row
+            if not found:
+                return {}
+            ids = list(found)
+            rows = np.array([found[message_id] for message_id in ids], dtype='int64')
+            order = np.argsort(rows)
+            vectors = self.vectors.take(rows[order])
+        return {ids[i]: vectors[j] for j, i in enumerate(order)}
+
+    def _row_at_time(self, timestamp: str) -> int:
+        """First row whose timestamp is not before ``timestamp``.
+
+        Messages are appended in time order (the write-behind queue stamps
+        them as it queues them), so the timestamp column is sorted and a time
+        range maps onto a contiguous range of rows.
+        """
+        lo, hi = 0, len(self.messages)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if (self.messages.get_field(mid, "timestamp") or "") < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _filter_rows(
+        self,
+        conversation_ids: Optional[Iterable[str]],
+        role: Optional[str],
+        since,
+        until,
+    ) -> Tuple[Optional[np.ndarray], int, int]:
+        """Resolve filters into candidate rows restricted to ``[lo, hi)``.
+
+        Candidate rows are None when only the time range restricts the search.
+        Callers hold the read lock.
+        """
+        ntotal = self.index.ntotal
+        lo = self._row_at_time(str(since)) if since is not None else 0
+        hi = self._row_at_time(str(until)) if until is not None else ntotal
+        hi = min(hi, ntotal)
+
+        if conversation_ids is None and role is None:
+            return None, lo, hi
+
+        if conversation_ids is not None:
+            rows = self.scopes.rows_for_conversations(conversation_ids)
+            if role is not None:
+                rows = rows[self.scopes.role_mask(role, rows)]
+        else:
+            rows = np.flatnonzero(self.scopes.role_mask(role)).astype('int64')
+        return rows[(rows >= lo) & (rows < hi)], lo, hi
+
+    def _exact_search(self, query_embedding: np.ndarray, rows: np.ndarray, k: int):
+        """Brute-force L2 search over a small candidate set, O(len(rows))."""
+        vectors = self.vectors.take(rows)
+        distances = ((vectors - query_embedding) ** 2).sum(axis=1)
+        if k < len(rows):
+            top = np.argpartition(distances, k)[:k]
+        else:
+            top = np.arange(len(rows))
+        top = top[np.argsort(distances[top])]
+        return distances[top], rows[top]
+
+    def search_similar_messages(
+        self,
+        query: str,
+        k: int = 5,
+        conversation_ids: Optional[Iterable[str]] = None,
+        role: Optional[str] = None,
+        since: Optional[Union[str, datetime]] = None,
+        until: Optional[Union[str, datetime]] = None,
+    ) -> List[Dict]:
+        """Search for similar messages using the query.
+
+        Results can be restricted to a set of conversations (e.g. those of
+        one user), a role and a ``[since, until)`` time range. Small scopes
+        are scanned exactly, so a filtered query costs what its subset costs;
+        larger ones fall back to a selector-filtered FAISS search. Each hit
+        carries its ``distance`` and cosine ``similarity`` to the query.
+        """
         if self.index.ntotal == 0:
             return []
 
         # Create query embedding
-        query_embedding = self.model.encode([query])[0]
-        
-        # Search in FAISS index
-        distances, indices = self.index.search(
-            np.array([query_embedding]).astype('float32'), 
-            min(k, self.index.ntotal)
-        )
+        query_embedding = np.asarray(self.encoder.encode([query])[0], dtype='float32')
         
-        # Return relevant messages
-        results = []
-        for idx in indices[0]:
-            if idx != -1:  # Valid index
-                results.append(self.messages[idx])
+        # Everything below sees one consistent state: no batch is applied
+        # and no rebuilt index is swapped in until the search finishes
+        with latency.measure("faiss_search"), self._rw.read():
+            index = self.index
+            rows, lo, hi = self._filter_rows(conversation_ids, role, since, until)
+            if lo >= hi or (rows is not None and len(rows) == 0):
+                return []
+
+            if rows is not None and len(rows) <= VECTOR_EXACT_SCAN_LIMIT and rows[-1] < len(self.vectors):
+                distances, indices = self._exact_search(query_embedding, rows, k)
+            else:
+                params = None
+                if rows is not None:
+                    params = search_params(index, faiss.IDSelectorBatch(rows), self.nprobe, self.ef_search)
+                elif lo > 0 or hi < index.ntotal:
+                    params = search_params(index, faiss.IDSelectorRange(lo, hi), self.nprobe, self.ef_search)
+
+                # Lossy layouts return a longer shortlist that is re-ranked
+                # exactly below, when every row's raw vector is on disk
+                rerank = (
+                    self.rerank > 0
+                    and index.ntotal <= len(self.vectors)
+                    and detect_kind(index) in LOSSY_KINDS
+                )
+                fetch = k * self.rerank if rerank else k
+
+                # Search in FAISS index
+                distances, indices = index.search(
+                    query_embedding.reshape(1, -1),
+                    min(fetch, index.ntotal),
+                    params=params,
+                )
+                distances, indices = distances[0], indices[0]
+                if rerank:
+                    candidates = np.sort(indices[indices != -1])
+                    distances, indices = self._exact_search(query_embedding, candidates, k)
+            
+            # Return relevant messages
+            results = []
+            for distance, idx in zip(distances, indices):
+                if idx != -1:  # Valid index
+                    message = self.messages[int(idx)]
+                    message["distance"] = float(distance)
+                    # Distances are squared L2; for the unit-length
+                    # embeddings the encoder produces, cosine = 1 - d / 2
+                    message["similarity"] = 1.0 - float(distance) / 2.0
+                    results.append(message)
         
         return results
 
-    def get_relevant_context(self, query: str, max_messages: int = 5) -> str:
+    def get_relevant_context(
+        self,
+        query: str,
+        max_messages: int = 5,
+        conversation_ids: Optional[Iterable[str]] = None,
+    ) -> str:
         """Get relevant context from previous messages for a query."""
-        similar_messages = self.search_similar_messages(query, k=max_messages)
+        similar_messages = self.search_similar_messages(query, k=max_messages, conversation_ids=conversation_ids)
         
         if not similar_messages:
             return ""
@@ -0,0 +1,86 @@
+import json
+import os
+import struct
+import zlib
+from typing import Dict, Iterator, List
+
+# Each record is: payload length, crc32 of payload
+_HEADER = struct.Struct("<II")
+
+
+class WriteJournal:
+    """Append-only on-disk journal of writes not yet applied to the stores.
+
+    Records are JSON objects framed like ``VectorLog`` records, so a torn
+    tail left by a crash is detected and dropped on replay.
+    """
+
+    def __init__(self, path: str, fsync: bool = False):
+        self.path = path
+        self.fsync = fsync
+        self.records = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "ab")
+
+    @staticmethod
+    def _encode(records: List[Dict]) -> bytes:
+        data = bytearray()
+        for record in records:
+            payload = json.dumps(record).encode("utf-8")
+            data += _HEADER.pack(len(payload), zlib.crc32(payload))
+            data += payload
+        return bytes(data)
+
+    def append(self, records: List[Dict]) -> None:
+        """Append records with a single write and (optional) fsync."""
+        self._file.write(self._encode(records))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.records += len(records)
+
+    def replay(self) -> Iterator[Dict]:
+        """Yield every intact record, truncating the file at the first torn one."""
+        valid_end = 0
+        self.records = 0
+        with open(self.path, "rb") as f:
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                length, crc = _HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                valid_end = f.tell()
+                self.records += 1
+                yield json.loads(payload.decode("utf-8"))
+
+        if valid_end < os.path.getsize(self.path):
+            self._file.truncate(valid_end)
+
+    def truncate(self) -> None:
+        """Discard all records once every one of them has been applied."""
+        self._file.truncate(0)
+        self._file.seek(0)
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.records = 0
+
+    def rewrite(self, records: List[Dict]) -> None:
+        """Atomically replace the journal with ``records``, e.g. the unapplied tail."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self._encode(records))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "ab")
+        self.records = len(records)
+
+    def close(self) -> None:
+        """Close the underlying file."""
+        if not self._file.closed:
+            self._file.close()
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config.settings import SESSION_IDLE_TIMEOUT, SESSION_SWEEP_INTERVAL
+
+
+def assistant_fingerprint(model: str, instructions: str, tools: List[Dict[str, Any]]) -> str:
+    """Stable hash of an assistant's definition; any change yields a new one."""
+    definition = json.dumps([model, instructions, tools], sort_keys=True)
+    return hashlib.sha256(definition.encode("utf-8")).hexdigest()[:32]
+
+
+class AssistantRegistry:
+    """Looks up or creates a remote Assistant once, keyed on its definition.
+
+    The assistant is tagged with the fingerprint of its model, instructions
+    and tools in its metadata, and the fingerprint -> id mapping is kept in a
+    small JSON file. Nothing touches the network until ``get`` is first
+    called; after that the id is served from memory. A known fingerprint
+    is resolved from the file, then from the account's existing assistants,
+    and only then is a new assistant created, so restarts do not leak
+    assistants and editing the prompt or tools picks up a fresh one.
+    """
+
+    def __init__(
+        self,
+        client,
+        model: str,
+        instructions: str,
+        tools: List[Dict[str, Any]],
+        path: str = "vampire_chat/database/assistants.json",
+    ):
+        self.client = client
+        self.model = model
+        self.instructions = instructions
+        self.tools = tools
+        self.path = path
+        self.fingerprint = assistant_fingerprint(model, instructions, tools)
+        self._assistant_id: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, str]:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, known: Dict[str, str]) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(f"{self.path}.tmp", "w") as f:
+            json.dump(known, f, indent=2)
+        os.replace(f"{self.path}.tmp", self.path)
+
+    def _find_remote(self) -> Optional[str]:
+        for assistant in self.client.beta.assistants.list(order="desc", limit=100):
+            if (assistant.metadata or {}).get("fingerprint") == self.fingerprint:
+                return assistant.id
+        return None
+
+    def get(self) -> str:
+        """Return the id of the assistant matching this definition."""
+        with self._lock:
+            if self._assistant_id is None:
+                known = self._load()
+                assistant_id = known.get(self.fingerprint)
+                if assistant_id is None:
+                    assistant_id = self._find_remote() or self.client.beta.assistants.create(
+                        model=self.model,
+                        instructions=self.instructions,
+                        tools=self.tools,
+                        metadata={"fingerprint": self.fingerprint},
+                    ).id
+                    known[self.fingerprint] = assistant_id
+                    self._save(known)
+                self._assistant_id = assistant_id
+            return self._assistant_id
+
+    def forget(self) -> None:
+        """Drop the cached id, e.g. after the remote assistant was deleted."""
+        with self._lock:
+            self._assistant_id = None
+            known = self._load()
+            if known.pop(self.fingerprint, None) is not None:
+                self._save(known)
+
+
+class SessionThreads:
+    """One remote Assistants thread per browser session, created on first use.
+
+    Runs on a thread are serialized by the API, so sharing one thread made
+    every user wait for everyone else; with a thread each, users' runs
+    proceed independently. Sessions idle for longer than ``idle_timeout``
+    seconds are evicted by a background sweeper, which also deletes their
+    remote threads.
+    """
+
+    def __init__(
+        self,
+        client,
+        idle_timeout: float = SESSION_IDLE_TIMEOUT,
+        sweep_interval: float = SESSION_SWEEP_INTERVAL,
+    ):
+        self.client = client
+        self.idle_timeout = idle_timeout
+        self._threads: Dict[str, Tuple[str, float]] = {}
+        self._creating: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sweeper = threading.Thread(
+            target=self._sweep, args=(sweep_interval,), name="assistant-thread-sweeper", daemon=True
+        )
+        self._sweeper.start()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._threads)
+
+    def get(self, session_id: str) -> str:
+        """Return the session's thread id, creating the thread on first use."""
+        with self._lock:
+            entry = self._threads.get(session_id)
+            if entry is not None:
+                self._threads[session_id] = (entry[0], time.monotonic())
+                return entry[0]
+            creating = self._creating.setdefault(session_id, threading.Lock())
+
+        # Create outside the registry lock so other sessions are not held up
+        with creating:
+            with self._lock:
+                entry = self._threads.get(session_id)
+                if entry is not None:
+                    return entry[0]
+            thread_id = self.client.beta.threads.create().id
+            with self._lock:
+                self._threads[session_id] = (thread_id, time.monotonic())
+                self._creating.pop(session_id, None)
+            return thread_id
+
+    def end(self, session_id: str) -> None:
+        """Forget a session and delete its remote thread."""
+        with self._lock:
+            entry = self._threads.pop(session_id, None)
+        if entry is not None:
+            self._delete(entry[0])
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Evict sessions idle past the timeout; returns how many were evicted."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            idle = [
+                session_id
+                for session_id, (_, last_used) in self._threads.items()
+                if now - last_used > self.idle_timeout
+            ]
+            evicted = [self._threads.pop(session_id)[0] for session_id in idle]
+        for thread_id in evicted:
+            self._delete(thread_id)
+        return len(evicted)
+
+    def _delete(self, thread_id: str) -> None:
+        try:
+            self.client.beta.threads.delete(thread_id)
+        except Exception as e:
+            print(f"Could not delete assistant thread {thread_id}: {e}")
+
+    def _sweep(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            self.evict_idle()
+
+    def close(self) -> None:
+        """Stop the background sweeper."""
+        self._stop.set()
@@ -1,57 +1,151 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Set, Tuple
+import time
 import uuid
-from datetime import datetime
 
+from ..config.settings import WRITE_BEHIND_FLUSH_TIMEOUT
 from ..database.db_manager import DatabaseManager
 from ..database.vector_store import VectorStore
+from .conversation_window import ConversationWindowCache
+from .executors import run_io
+from .prompt_builder import PromptBuilder, Summarizer
+from .response_cache import SemanticResponseCache
+from .retrieval import HybridRetriever
+from .timing import latency
+from .write_behind import WriteBehindQueue
 
-class ChatHistoryManager:
-    def __init__(self):
+SYSTEM_PROMPT = "You are a vampire named Lilly, a friendly teenage vampire who loves chatting with children."
+
+class SharedResources:
+    """Process-wide heavy resources shared by every chat session.
+
+    Each member is safe to use from many threads at once: the database goes
+    through a connection pool, and the vector store, write-behind queue,
+    conversation windows, prompt builder and response cache guard their own
+    state; the retriever holds no state of its own.
+    """
+
+    def __init__(self, summarizer: Optional[Summarizer] = None):
         self.db_manager = DatabaseManager()
         self.vector_store = VectorStore()
+        self.write_queue = WriteBehindQueue(self.db_manager, self.vector_store)
+        self.retriever = HybridRetriever(self.db_manager, self.vector_store)
+        self.windows = ConversationWindowCache(self.db_manager, pending=self.write_queue.pending_messages)
+        self.prompt_builder = PromptBuilder(summarizer=summarizer)
+        self.response_cache = SemanticResponseCache(self.vector_store.encoder)
+
+class ChatHistoryManager:
+    def __init__(self, summarizer: Optional[Summarizer] = None, resources: Optional[SharedResources] = None):
+        # A standalone manager gets its own resources; sessions share theirs
+        self.resources = resources or SharedResources(summarizer=summarizer)
+        self.db_manager = self.resources.db_manager
+        self.vector_store = self.resources.vector_store
+        self.write_queue = self.resources.write_queue
+        self.retriever = self.resources.retriever
+        self.windows = self.resources.windows
+        self.prompt_builder = self.resources.prompt_builder
         self.current_conversation_id = None
+        # The persisted user this manager chats for, if known (see set_user)
+        self.user_id = None
+        # Conversations this manager has started or loaded
+        self.conversation_ids = []
+        # The conversation the last prompt was built for, and the ids of the
+        # window messages it carried
+        self._prompted: Tuple[Optional[str], Set[str]] = (None, set())
+
+    def set_user(self, user_id: str) -> None:
+        """Chat for ``user_id`` from now on.
+
+        Retrieval then covers every conversation of that user, including
+        ones from earlier sessions and other tabs, and nobody else's; new
+        conversations are recorded as theirs. Until a user is set retrieval
+        is unscoped.
+        """
+        self.user_id = user_id
+
+    def _retrieval_scope(self) -> Optional[List[str]]:
+        """The user's conversations plus this manager's own, or None without a user.
+
+        Looked up for every query, so conversations the user started
+        elsewhere since are included.
+        """
+        if self.user_id is None:
+            return None
+        return list(dict.fromkeys(self.db_manager.get_user_conversation_ids(self.user_id) + self.conversation_ids))
 
     def start_new_conversation(self) -> str:
         """Start a new conversation and return its ID."""
         conversation_id = str(uuid.uuid4())
         self.current_conversation_id = conversation_id
-        self.db_manager.create_conversation(conversation_id)
+        self.conversation_ids.append(conversation_id)
+        self.write_queue.create_conversation(conversation_id, self.user_id)
+        self.windows.start(conversation_id)
         return conversation_id
 
-    def add_message(self, role: str, content: str) -> None:
-        """Add a message to both SQLite and vector storage."""
-        if not self.current_conversation_id:
-            self.start_new_conversation()
+    async def start_new_conversation_async(self) -> str:
+        """Start a new conversation without blocking the event loop."""
+        conversation_id = str(uuid.uuid4())
+        self.current_conversation_id = conversation_id
+        self.conversation_ids.append(conversation_id)
+        await run_io(self.write_queue.create_conversation, conversation_id, self.user_id)
+        self.windows.start(conversation_id)
+        return conversation_id
 
-        message_id = str(uuid.uuid4())
-        message = {
-            "message_id": message_id,
+    def _new_message(self, role: str, content: str) -> Dict:
+        return {
+            "message_id": str(uuid.uuid4()),
             "conversation_id": self.current_conversation_id,
             "role": role,
             "content": content,
-            "timestamp": str(datetime.now())
         }
 
-        # Add to SQLite database
-        self.db_manager.add_message(
-            conversation_id=self.current_conversation_id,
-            role=role,
-            content=content,
-            message_id=message_id
-        )
+    def add_message(self, role: str, content: str) -> None:
+        """Add a message to both SQLite and vector storage.
+
+        Returns once the message is journaled; the write-behind queue
+        persists and indexes it in the background, and the conversation
+        window serves it to prompt assembly in the meantime.
+        """
+        if not self.current_conversation_id:
+            self.start_new_conversation()
+
+        message = self._new_message(role, content)
+        self.write_queue.add_message(message)
+        self.windows.append(self.current_conversation_id, message)
+
+    async def add_message_async(self, role: str, content: str) -> None:
+        """Add a message without blocking the event loop on the journal write."""
+        if not self.current_conversation_id:
+            await self.start_new_conversation_async()
 
-        # Add to vector store
-        self.vector_store.add_message(message)
+        message = self._new_message(role, content)
+        await run_io(self.write_queue.add_message, message)
+        self.windows.append(message["conversation_id"], message)
+
+    def _unflushed_messages(self) -> List[Dict]:
+        """Wait for queued writes before a read straight from SQLite.
+
+        Returns the current conversation's messages that are still queued if
+        the wait times out, for the caller to merge in from memory.
+        """
+        if self.write_queue.flush(timeout=WRITE_BEHIND_FLUSH_TIMEOUT):
+            return []
+        return self.write_queue.pending_messages(self.current_conversation_id)
 
     def get_conversation_history(self, limit: Optional[int] = None) -> List[List[str]]:
         """Get the current conversation history formatted for Gradio chatbot."""
         if not self.current_conversation_id:
             return []
         
+        pending = self._unflushed_messages()
         messages = self.db_manager.get_conversation_history(
             self.current_conversation_id,
             limit=limit
         )
+        if pending:
+            stored = {msg["message_id"] for msg in messages}
+            messages += [msg for msg in pending if msg["message_id"] not in stored]
+            if limit:
+                messages = messages[-limit:]
         
         # Format messages for Gradio chatbot [[user_msg, bot_msg], ...]
         chat_history = []
@@ -76,36 +170,107 @@ class ChatHistoryManager:
         
         return chat_history
 
+    def get_conversation_page(
+        self,
+        limit: int = 50,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+    ) -> Dict:
+        """Get a keyset-paginated window of the current conversation.
+
+        Messages still queued are appended to a page that reaches the newest
+        stored message. They carry no cursor, so ``after`` keeps pointing at
+        the last stored message.
+        """
+        if not self.current_conversation_id:
+            return {"messages": [], "before": None, "after": None, "has_more": False}
+        pending = self._unflushed_messages()
+        page = self.db_manager.get_messages_page(
+            self.current_conversation_id, limit=limit, before=before, after=after
+        )
+        if pending and before is None and not (after is not None and page["has_more"]):
+            stored = {msg["message_id"] for msg in page["messages"]}
+            page["messages"] += [msg for msg in pending if msg["message_id"] not in stored]
+        return page
+
+    def has_history(self) -> bool:
+        """Whether the current conversation holds more than its newest message."""
+        if not self.current_conversation_id:
+            return False
+        return len(self.windows.get(self.current_conversation_id)) > 1
+
+    def _prompt_message_ids(self) -> Set[str]:
+        """Ids of the window messages the next prompt will carry.
+
+        That is what the last prompt kept plus everything added since; older
+        turns, which the prompt only has as a summary, stay retrievable.
+        Before a conversation's first prompt, the turns a prompt without
+        retrieved context would keep stand in.
+        """
+        if not self.current_conversation_id:
+            return set()
+        window = self.windows.get(self.current_conversation_id)
+        conversation_id, prompted = self._prompted
+        if conversation_id != self.current_conversation_id:
+            kept = len(self.prompt_builder.build(SYSTEM_PROMPT, window)) - 1
+            return {msg["message_id"] for msg in window[len(window) - kept:]}
+
+        ids = set(prompted)
+        for msg in reversed(window):
+            if msg["message_id"] in prompted:
+                break
+            ids.add(msg["message_id"])
+        return ids
+
     def get_relevant_context(self, query: str, max_messages: int = 5) -> str:
-        """Get relevant context from previous conversations."""
-        return self.vector_store.get_relevant_context(query, max_messages)
+        """Get relevant context from the user's conversations (all of them if no user is set).
+
+        Messages the prompt carries verbatim anyway are left out.
+        """
+        return self.retriever.get_relevant_context(
+            query, max_messages, conversation_ids=self._retrieval_scope(),
+            exclude_ids=self._prompt_message_ids(),
+        )
+
+    async def get_relevant_context_async(self, query: str, max_messages: int = 5) -> str:
+        """Search BM25 and FAISS concurrently on the executor pools."""
+        start = time.perf_counter()
+        exclude_ids = await run_io(self._prompt_message_ids)
+        conversation_ids = await run_io(self._retrieval_scope)
+        context = await self.retriever.get_relevant_context_async(
+            query, max_messages, conversation_ids=conversation_ids, exclude_ids=exclude_ids
+        )
+        latency.record("retrieval", time.perf_counter() - start)
+        return context
 
     def load_conversation(self, conversation_id: str) -> None:
         """Load an existing conversation."""
         self.current_conversation_id = conversation_id
+        if conversation_id not in self.conversation_ids:
+            self.conversation_ids.append(conversation_id)
+        self.windows.load(conversation_id)
 
     def get_recent_conversations(self, limit: int = 10) -> List[Dict]:
         """Get list of recent conversations."""
         return self.db_manager.get_recent_conversations(limit)
 
-    def format_conversation_for_openai(self, include_context: bool = True) -> List[Dict]:
-        """Format conversation history for OpenAI API."""
-        messages = []
-        
-        # Add system message
-        messages.append({
-            "role": "system",
-            "content": "You are a vampire named Lilly, a friendly teenage vampire who loves chatting with children."
-        })
-        
-        # Get conversation history from database
-        history = self.db_manager.get_conversation_history(self.current_conversation_id)
-        
-        # Add messages from history
-        for msg in history:
-            messages.append({
-                "role": msg["role"],
-                "content": msg["content"]
-            })
-        
-        return messages
+    def format_conversation_for_openai(self, include_context: bool = True, context: str = "") -> List[Dict]:
+        """Format conversation history for OpenAI API within the prompt token budget."""
+        # Recent history comes from the in-memory window, not the database
+        with latency.measure("prompt_assembly"):
+            history = self.windows.get(self.current_conversation_id) if self.current_conversation_id else []
+
+            messages = self.prompt_builder.build(
+                SYSTEM_PROMPT,
+                history,
+                context=context if include_context else "",
+                conversation_id=self.current_conversation_id,
+            )
+            # After the system message the prompt carries the newest turns
+            kept = history[len(history) - (len(messages) - 1):]
+            self._prompted = (self.current_conversation_id, {msg["message_id"] for msg in kept})
+            return messages
+
+    async def format_conversation_for_openai_async(self, include_context: bool = True, context: str = "") -> List[Dict]:
+        """Async variant; a cold conversation window is read from SQLite on the I/O pool."""
+        return await run_io(self.format_conversation_for_openai, include_context, context)
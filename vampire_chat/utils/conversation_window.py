@@ -0,0 +1,84 @@
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, List, Optional
+
+from ..config.settings import CONVERSATION_CACHE_SIZE, CONVERSATION_WINDOW_SIZE
+from ..database.db_manager import DatabaseManager
+
+
+class ConversationWindowCache:
+    """LRU cache of the most recent messages of each active conversation.
+
+    A window is read from the database only when a conversation is not
+    cached (cold start, eviction) or is explicitly (re)loaded; afterwards it
+    is kept in sync by ``append``. Memory is bounded by ``window_size``
+    messages for each of at most ``max_conversations`` conversations.
+
+    ``pending`` returns a conversation's messages that are acknowledged but
+    not yet in the database (see ``WriteBehindQueue``); they are merged into
+    windows read from the database so a reload never loses recent turns.
+    """
+
+    def __init__(
+        self,
+        db_manager: DatabaseManager,
+        window_size: int = CONVERSATION_WINDOW_SIZE,
+        max_conversations: int = CONVERSATION_CACHE_SIZE,
+        pending: Optional[Callable[[str], List[Dict]]] = None,
+    ):
+        self.db_manager = db_manager
+        self.pending = pending
+        self.window_size = window_size
+        self.max_conversations = max_conversations
+        self._windows: "OrderedDict[str, Deque[Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _put(self, conversation_id: str, window: Deque[Dict]) -> None:
+        self._windows[conversation_id] = window
+        self._windows.move_to_end(conversation_id)
+        while len(self._windows) > self.max_conversations:
+            self._windows.popitem(last=False)
+
+    def start(self, conversation_id: str) -> None:
+        """Register a brand-new conversation without touching the database."""
+        with self._lock:
+            self._put(conversation_id, deque(maxlen=self.window_size))
+
+    def load(self, conversation_id: str) -> List[Dict]:
+        """(Re)load a conversation's window from the database."""
+        # Read the queue first: a message applied in between is then found
+        # in the database instead of being missed by both reads
+        pending = self.pending(conversation_id) if self.pending else []
+        messages = self.db_manager.get_messages_page(conversation_id, limit=self.window_size)["messages"]
+        if pending:
+            stored = {msg["message_id"] for msg in messages}
+            messages = (messages + [msg for msg in pending if msg["message_id"] not in stored])[-self.window_size:]
+        with self._lock:
+            self._put(conversation_id, deque(messages, maxlen=self.window_size))
+        return messages
+
+    def get(self, conversation_id: str) -> List[Dict]:
+        """Return the cached window, oldest message first."""
+        with self._lock:
+            window = self._windows.get(conversation_id)
+            if window is not None:
+                self._windows.move_to_end(conversation_id)
+                return list(window)
+        return self.load(conversation_id)
+
+    def append(self, conversation_id: str, message: Dict) -> None:
+        """Add a just-persisted (or just-queued) message to a cached window.
+
+        Uncached conversations are left alone; their next ``get`` reads the
+        database and the write-behind queue, one of which holds the message.
+        """
+        with self._lock:
+            window = self._windows.get(conversation_id)
+            if window is not None:
+                window.append(message)
+                self._windows.move_to_end(conversation_id)
+
+    def evict(self, conversation_id: str) -> None:
+        """Drop a conversation's window."""
+        with self._lock:
+            self._windows.pop(conversation_id, None)
@@ -0,0 +1,27 @@
+"""
+Shared thread pools that keep blocking work off the asyncio event loop.
+
+SQLite and file I/O go to ``io_executor``; CPU-bound embedding and FAISS
+work goes to the smaller ``compute_executor`` so it cannot crowd out I/O.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from ..config.settings import COMPUTE_THREADS, IO_THREADS
+
+io_executor = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix="vampire-io")
+compute_executor = ThreadPoolExecutor(max_workers=COMPUTE_THREADS, thread_name_prefix="vampire-compute")
+
+
+async def run_io(func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking I/O call on the I/O pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_executor, functools.partial(func, *args, **kwargs))
+
+
+async def run_compute(func: Callable, *args, **kwargs) -> Any:
+    """Run a CPU-bound call on the compute pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(compute_executor, functools.partial(func, *args, **kwargs))
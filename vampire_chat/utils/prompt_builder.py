@@ -0,0 +1,176 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ..config.settings import (
+    CONVERSATION_CACHE_SIZE,
+    PROMPT_CONTEXT_TOKENS,
+    PROMPT_SUMMARY_TOKENS,
+    PROMPT_SYSTEM_TOKENS,
+    PROMPT_TOKEN_BUDGET,
+    PROMPT_TOKENIZER,
+)
+import tiktoken
+
+# Tokens the chat format spends on each message besides its content
+MESSAGE_OVERHEAD = 4
+
+# Folds evicted turns into a rolling summary: (previous summary, messages) -> summary
+Summarizer = Callable[[str, List[Dict]], str]
+
+
+class TokenCounter:
+    """Counts tokens with a local tiktoken encoding.
+
+    If the encoding cannot be loaded (its file is not cached and we are
+    offline), a character-based estimate is used instead.
+    """
+
+    def __init__(self, encoding_name: str = PROMPT_TOKENIZER):
+        try:
+            self._encoding = tiktoken.get_encoding(encoding_name)
+        except Exception:
+            self._encoding = None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        # Roughly four characters per token for English text
+        return (len(text) + 3) // 4
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut ``text`` down to at most ``max_tokens`` tokens."""
+        if self.count(text) <= max_tokens:
+            return text
+        if self._encoding is not None:
+            return self._encoding.decode(self._encoding.encode(text, disallowed_special=())[:max_tokens])
+        return text[:max_tokens * 4]
+
+
+class PromptBuilder:
+    """Assembles chat prompts that fit a fixed token budget.
+
+    The budget is split between the system prompt, a rolling summary of
+    older turns, retrieved context and as many recent turns as still fit,
+    newest first. The newest turn (the child's message) is always sent, cut
+    down to what is left of the budget if it is too long on its own. Turns
+    that no longer fit are folded into the summary by ``summarizer`` on a
+    background thread; until that finishes, the previous summary is used,
+    so summarization never delays a request.
+    """
+
+    def __init__(
+        self,
+        summarizer: Optional[Summarizer] = None,
+        counter: Optional[TokenCounter] = None,
+        total_tokens: int = PROMPT_TOKEN_BUDGET,
+        system_tokens: int = PROMPT_SYSTEM_TOKENS,
+        summary_tokens: int = PROMPT_SUMMARY_TOKENS,
+        context_tokens: int = PROMPT_CONTEXT_TOKENS,
+        max_summaries: int = CONVERSATION_CACHE_SIZE,
+    ):
+        self.summarizer = summarizer
+        self.counter = counter or TokenCounter()
+        self.total_tokens = total_tokens
+        self.system_tokens = system_tokens
+        self.summary_tokens = summary_tokens
+        self.context_tokens = context_tokens
+        self.max_summaries = max_summaries
+
+        # conversation_id -> (id of the last message folded in, summary text)
+        self._summaries: "OrderedDict[str, Tuple[Optional[str], str]]" = OrderedDict()
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prompt-summarizer")
+
+    def get_summary(self, conversation_id: str) -> str:
+        """Return the latest rolling summary for a conversation."""
+        with self._lock:
+            return self._summaries.get(conversation_id, (None, ""))[1]
+
+    def build(
+        self,
+        system_prompt: str,
+        history: List[Dict],
+        context: str = "",
+        conversation_id: Optional[str] = None,
+    ) -> List[Dict]:
+        """Build the message list for a chat completion request."""
+        system_content = self.counter.truncate(system_prompt, self.system_tokens)
+
+        summary = self.get_summary(conversation_id) if conversation_id else ""
+        if summary:
+            summary = self.counter.truncate(summary, self.summary_tokens)
+            system_content += f"\n\nSummary of the earlier conversation:\n{summary}"
+
+        if context:
+            context = self.counter.truncate(context, self.context_tokens)
+            system_content += f"\n\nRelevant context from previous conversations:\n{context}"
+
+        remaining = self.total_tokens - self.counter.count(system_content) - MESSAGE_OVERHEAD
+
+        # Keep the newest turns that fit in what is left of the budget
+        kept = 0
+        for msg in reversed(history):
+            cost = self.counter.count(msg["content"]) + MESSAGE_OVERHEAD
+            if cost > remaining:
+                break
+            remaining -= cost
+            kept += 1
+        cut = len(history) - kept
+
+        truncated = None
+        if history and kept == 0:
+            # Never drop the question being answered, even if it alone is over budget
+            cut = len(history) - 1
+            truncated = self.counter.truncate(history[-1]["content"], max(remaining - MESSAGE_OVERHEAD, 0))
+
+        if cut and conversation_id and self.summarizer is not None:
+            self._schedule_summary(conversation_id, history, cut)
+
+        messages = [{"role": "system", "content": system_content}]
+        messages.extend({"role": msg["role"], "content": msg["content"]} for msg in history[cut:])
+        if truncated is not None:
+            messages[-1]["content"] = truncated
+        return messages
+
+    def _schedule_summary(self, conversation_id: str, history: List[Dict], cut: int) -> None:
+        """Queue folding ``history[:cut]`` into the summary, unless it already is."""
+        ids = [msg.get("message_id") for msg in history]
+        with self._lock:
+            if conversation_id in self._in_flight:
+                return
+            covered_id, previous = self._summaries.get(conversation_id, (None, ""))
+            start = 0
+            if covered_id is not None and covered_id in ids:
+                start = ids.index(covered_id) + 1
+                if start >= cut:
+                    return
+            self._in_flight.add(conversation_id)
+
+        self._executor.submit(
+            self._summarize, conversation_id, previous, history[start:cut], ids[cut - 1]
+        )
+
+    def _summarize(self, conversation_id: str, previous: str, messages: List[Dict], covered_id: Optional[str]) -> None:
+        try:
+            summary = self.summarizer(previous, messages)
+            summary = self.counter.truncate(summary or "", self.summary_tokens)
+            with self._lock:
+                self._summaries[conversation_id] = (covered_id, summary)
+                self._summaries.move_to_end(conversation_id)
+                while len(self._summaries) > self.max_summaries:
+                    self._summaries.popitem(last=False)
+        except Exception as e:
+            print(f"Summarization error: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(conversation_id)
+
+    def forget(self, conversation_id: str) -> None:
+        """Drop the cached summary of a conversation."""
+        with self._lock:
+            self._summaries.pop(conversation_id, None)
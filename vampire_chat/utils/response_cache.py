@@ -0,0 +1,163 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..config.settings import (
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_SIMILARITY,
+    RESPONSE_CACHE_SIZE,
+    RESPONSE_CACHE_TTL,
+)
+from ..database.encoder import EmbeddingEncoder
+
+
+def normalize_prompt(text: str) -> str:
+    """Lowercase and strip punctuation so trivially different prompts match."""
+    return " ".join(re.findall(r"\w+", (text or "").lower()))
+
+
+def persona_key(*parts: str) -> str:
+    """Stable key for a persona, e.g. from its system prompt and model name.
+
+    Changing any part yields a new key, so stale answers are never served
+    to a persona that has since been edited.
+    """
+    return hashlib.sha1("\0".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+class SemanticResponseCache:
+    """Opt-in cache of assistant replies keyed on prompt meaning.
+
+    A prompt hits if its normalized text was seen before for the same
+    persona (no embedding needed), or if its embedding is at least
+    ``similarity`` cosine-similar to a cached prompt's. Entries expire
+    after ``ttl`` seconds, at most ``max_entries`` are kept across all
+    personas (least recently used go first), and ``invalidate`` drops a
+    persona's entries at once. Embeddings come from the shared encoder, so
+    a prompt that is stored after a miss is not encoded twice.
+
+    Entries are shared by everyone chatting with a persona, so only store
+    replies that depend on nothing but the prompt, not on a user's history
+    or retrieved context.
+    """
+
+    def __init__(
+        self,
+        encoder: EmbeddingEncoder,
+        enabled: bool = RESPONSE_CACHE_ENABLED,
+        similarity: float = RESPONSE_CACHE_SIMILARITY,
+        ttl: float = RESPONSE_CACHE_TTL,
+        max_entries: int = RESPONSE_CACHE_SIZE,
+    ):
+        self.encoder = encoder
+        self.enabled = enabled
+        self.similarity = similarity
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # (persona, normalized prompt) -> (unit embedding, response, expiry)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[np.ndarray, str, float]]" = OrderedDict()
+        # persona -> (entry keys, stacked embeddings), rebuilt after changes
+        self._matrices: Dict[str, Tuple[List[Tuple[str, str]], np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def _embed(self, normalized: str) -> np.ndarray:
+        embedding = np.asarray(self.encoder.encode([normalized])[0], dtype="float32")
+        norm = float(np.linalg.norm(embedding))
+        return embedding / norm if norm else embedding
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        if self._entries.pop(key, None) is not None:
+            self._matrices.pop(key[0], None)
+
+    def _matrix(self, persona: str) -> Tuple[List[Tuple[str, str]], Optional[np.ndarray]]:
+        if persona not in self._matrices:
+            keys = [key for key in self._entries if key[0] == persona]
+            matrix = np.vstack([self._entries[key][0] for key in keys]) if keys else None
+            self._matrices[persona] = (keys, matrix)
+        return self._matrices[persona]
+
+    def _hit(self, key: Tuple[str, str], now: float) -> Optional[str]:
+        """Return a live entry's response (refreshing its LRU position) or None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[2] <= now:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def get(self, prompt: str, persona: str) -> Optional[str]:
+        """Return a cached response for a semantically equivalent prompt."""
+        if not self.enabled:
+            return None
+        normalized = normalize_prompt(prompt)
+        if not normalized:
+            return None
+
+        with self._lock:
+            response = self._hit((persona, normalized), time.monotonic())
+            if response is not None:
+                return response
+
+        embedding = self._embed(normalized)
+        with self._lock:
+            keys, matrix = self._matrix(persona)
+            if matrix is not None:
+                similarities = matrix @ embedding
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity:
+                    response = self._hit(keys[best], time.monotonic())
+                    if response is not None:
+                        return response
+            self.misses += 1
+            return None
+
+    def put(self, prompt: str, persona: str, response: str) -> None:
+        """Cache ``response`` as the answer to ``prompt`` for ``persona``."""
+        if not self.enabled or not response:
+            return
+        normalized = normalize_prompt(prompt)
+        if not normalized:
+            return
+
+        embedding = self._embed(normalized)
+        with self._lock:
+            key = (persona, normalized)
+            self._entries[key] = (embedding, response, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            self._matrices.pop(persona, None)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._matrices.pop(evicted[0], None)
+                self.evictions += 1
+
+    def invalidate(self, persona: Optional[str] = None) -> int:
+        """Drop every entry of ``persona`` (or of all personas); returns how many."""
+        with self._lock:
+            keys = [key for key in self._entries if persona is None or key[0] == persona]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
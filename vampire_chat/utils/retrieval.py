@@ -0,0 +1,223 @@
+import asyncio
+import re
+from datetime import datetime
+from typing import AbstractSet, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from ..config.settings import (
+    RETRIEVAL_CANDIDATES,
+    RETRIEVAL_DEDUP_SIMILARITY,
+    RETRIEVAL_HALF_LIFE_DAYS,
+    RETRIEVAL_HYBRID,
+    RETRIEVAL_MIN_SIMILARITY,
+    RETRIEVAL_RRF_K,
+)
+from ..database.db_manager import DatabaseManager
+from ..database.vector_store import VectorStore
+from .executors import io_executor, run_compute, run_io
+
+
+def reciprocal_rank_fusion(rankings: Sequence[List[Dict]], k: int = RETRIEVAL_RRF_K) -> List[Dict]:
+    """Fuse ranked result lists, scoring each message by ``sum(1 / (k + rank))``.
+
+    Only ranks are used, so BM25 and L2 distances never need to be put on
+    a common scale. Messages are matched across lists by ``id``.
+    """
+    fused: Dict[str, Dict] = {}
+    for ranking in rankings:
+        for rank, message in enumerate(ranking, start=1):
+            entry = fused.setdefault(message["id"], dict(message, score=0.0))
+            entry["score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda message: message["score"], reverse=True)
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(re.findall(r"\w+", (text or "").lower()))
+
+
+def _cosine(a: np.ndarray, b: np.ndarray) -> float:
+    norm = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(np.dot(a, b)) / norm if norm else 0.0
+
+
+def format_context(messages: List[Dict]) -> str:
+    """Render retrieved messages the way the system prompt expects them."""
+    if not messages:
+        return ""
+    context = "Related previous messages:\n\n"
+    for msg in messages:
+        context += f"{msg['role']}: {msg['content']}\n"
+    return context
+
+
+class HybridRetriever:
+    """Retrieves context from both the FTS5 (BM25) index and FAISS.
+
+    Dense embeddings miss names, numbers and rare words that BM25 matches
+    exactly, and vice versa. Each source returns ``candidates`` results,
+    gathered concurrently, and the two rankings are merged with reciprocal
+    rank fusion.
+
+    The fused candidates are then filtered rather than cut at a fixed k:
+    messages the caller already has in its prompt are excluded, hits less
+    similar to the query than ``min_similarity`` are dropped, scores decay
+    with age, and near-duplicates collapse into their best-scoring copy.
+    ``k`` is only an upper bound.
+    """
+
+    def __init__(
+        self,
+        db_manager: DatabaseManager,
+        vector_store: VectorStore,
+        candidates: int = RETRIEVAL_CANDIDATES,
+        rrf_k: int = RETRIEVAL_RRF_K,
+        hybrid: bool = RETRIEVAL_HYBRID,
+        min_similarity: float = RETRIEVAL_MIN_SIMILARITY,
+        dedup_similarity: float = RETRIEVAL_DEDUP_SIMILARITY,
+        half_life_days: float = RETRIEVAL_HALF_LIFE_DAYS,
+    ):
+        self.db_manager = db_manager
+        self.vector_store = vector_store
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self.hybrid = hybrid
+        self.min_similarity = min_similarity
+        self.dedup_similarity = dedup_similarity
+        self.half_life_days = half_life_days
+
+    def _dense(self, query: str, k: int, conversation_ids: Optional[List[str]]) -> List[Dict]:
+        return self.vector_store.search_similar_messages(query, k=k, conversation_ids=conversation_ids)
+
+    def _lexical(self, query: str, k: int, conversation_ids: Optional[List[str]]) -> List[Dict]:
+        return [
+            {
+                "id": row["message_id"],
+                "conversation_id": row["conversation_id"],
+                "role": row["role"],
+                "content": row["content"],
+                "timestamp": row["timestamp"],
+            }
+            for row in self.db_manager.search_messages(query, limit=k, conversation_ids=conversation_ids)
+        ]
+
+    def _decay(self, timestamp: Optional[str], now: datetime) -> float:
+        if not self.half_life_days or not timestamp:
+            return 1.0
+        try:
+            age_days = (now - datetime.fromisoformat(timestamp)).total_seconds() / 86400
+        except ValueError:
+            return 1.0
+        return 0.5 ** (max(age_days, 0.0) / self.half_life_days)
+
+    def _select(
+        self,
+        query: str,
+        rankings: Sequence[List[Dict]],
+        k: int,
+        exclude_ids: Optional[AbstractSet[str]],
+    ) -> List[Dict]:
+        """Fuse rankings, then exclude, threshold, decay and de-duplicate."""
+        candidates = [
+            message for message in reciprocal_rank_fusion(rankings, self.rrf_k)
+            if not exclude_ids or message["id"] not in exclude_ids
+        ]
+        if not candidates:
+            return []
+
+        # Score every candidate against the query the same way, including
+        # BM25-only hits; the query embedding is an encoder cache hit
+        embeddings = self.vector_store.get_embeddings(message["id"] for message in candidates)
+        query_embedding = self.vector_store.encoder.encode([query])[0]
+        now = datetime.now()
+
+        scored = []
+        for message in candidates:
+            embedding = embeddings.get(message["id"])
+            if embedding is not None:
+                message["similarity"] = _cosine(embedding, query_embedding)
+            similarity = message.get("similarity")
+            if similarity is not None and similarity < self.min_similarity:
+                continue
+            message["score"] *= self._decay(message.get("timestamp"), now)
+            scored.append((message, embedding))
+        scored.sort(key=lambda item: item[0]["score"], reverse=True)
+
+        selected, seen_texts, seen_embeddings = [], set(), []
+        for message, embedding in scored:
+            text = _normalize_text(message["content"])
+            if text in seen_texts:
+                continue
+            if embedding is not None and any(
+                _cosine(embedding, other) >= self.dedup_similarity for other in seen_embeddings
+            ):
+                continue
+            selected.append(message)
+            seen_texts.add(text)
+            if embedding is not None:
+                seen_embeddings.append(embedding)
+            if len(selected) == k:
+                break
+        return selected
+
+    def _pool_size(self, k: int, exclude_ids: Optional[AbstractSet[str]]) -> int:
+        # Excluded messages must not crowd everything else out of the pool
+        return max(k, self.candidates) + (len(exclude_ids) if exclude_ids else 0)
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        conversation_ids: Optional[Iterable[str]] = None,
+        exclude_ids: Optional[AbstractSet[str]] = None,
+    ) -> List[Dict]:
+        """Return up to ``k`` relevant messages for ``query``, best first."""
+        if conversation_ids is not None:
+            conversation_ids = list(conversation_ids)
+        pool = self._pool_size(k, exclude_ids)
+        if not self.hybrid:
+            return self._select(query, [self._dense(query, pool, conversation_ids)], k, exclude_ids)
+
+        # BM25 runs on the I/O pool while this thread embeds and searches FAISS
+        lexical = io_executor.submit(self._lexical, query, pool, conversation_ids)
+        dense = self._dense(query, pool, conversation_ids)
+        return self._select(query, [dense, lexical.result()], k, exclude_ids)
+
+    async def search_async(
+        self,
+        query: str,
+        k: int = 5,
+        conversation_ids: Optional[Iterable[str]] = None,
+        exclude_ids: Optional[AbstractSet[str]] = None,
+    ) -> List[Dict]:
+        """Async variant: BM25 on the I/O pool and FAISS on the compute pool, concurrently."""
+        if conversation_ids is not None:
+            conversation_ids = list(conversation_ids)
+        pool = self._pool_size(k, exclude_ids)
+        if not self.hybrid:
+            rankings = [await run_compute(self._dense, query, pool, conversation_ids)]
+        else:
+            rankings = await asyncio.gather(
+                run_compute(self._dense, query, pool, conversation_ids),
+                run_io(self._lexical, query, pool, conversation_ids),
+            )
+        return await run_compute(self._select, query, rankings, k, exclude_ids)
+
+    def get_relevant_context(
+        self,
+        query: str,
+        max_messages: int = 5,
+        conversation_ids: Optional[Iterable[str]] = None,
+        exclude_ids: Optional[AbstractSet[str]] = None,
+    ) -> str:
+        """Get relevant context from previous messages for a query."""
+        return format_context(self.search(query, max_messages, conversation_ids, exclude_ids))
+
+    async def get_relevant_context_async(
+        self,
+        query: str,
+        max_messages: int = 5,
+        conversation_ids: Optional[Iterable[str]] = None,
+        exclude_ids: Optional[AbstractSet[str]] = None,
+    ) -> str:
+        return format_context(await self.search_async(query, max_messages, conversation_ids, exclude_ids))
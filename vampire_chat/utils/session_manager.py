@@ -0,0 +1,103 @@
+import threading
+import time
+from typing import Dict, Optional, Set, Tuple
+
+from ..config.settings import SESSION_IDLE_TIMEOUT, SESSION_SWEEP_INTERVAL
+from .chat_history import ChatHistoryManager, SharedResources
+
+
+class SessionManager:
+    """Per-session ChatHistoryManagers on top of one set of shared resources.
+
+    Every browser session (keyed by Gradio's ``session_hash``) gets its own
+    current conversation, while the embedding model, FAISS index and
+    database pool are shared. A background sweeper releases the cached
+    conversation windows and summaries of sessions idle for longer than
+    ``idle_timeout`` seconds, but keeps the session bound to its
+    conversations: the next message reloads the window from SQLite and
+    carries on where the session left off. A session is only forgotten
+    when it ends.
+    """
+
+    def __init__(
+        self,
+        resources: SharedResources,
+        idle_timeout: float = SESSION_IDLE_TIMEOUT,
+        sweep_interval: float = SESSION_SWEEP_INTERVAL,
+    ):
+        self.resources = resources
+        self.idle_timeout = idle_timeout
+        self._sessions: Dict[str, Tuple[ChatHistoryManager, float]] = {}
+        # Sessions whose caches were released since they were last used
+        self._released: Set[str] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sweeper = threading.Thread(
+            target=self._sweep, args=(sweep_interval,), name="session-sweeper", daemon=True
+        )
+        self._sweeper.start()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def get(self, session_id: str) -> ChatHistoryManager:
+        """Return the session's manager, creating it on first use."""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            manager = entry[0] if entry else ChatHistoryManager(resources=self.resources)
+            self._sessions[session_id] = (manager, time.monotonic())
+            self._released.discard(session_id)
+            return manager
+
+    def end(self, session_id: str) -> None:
+        """Forget a session and release the per-conversation caches it held."""
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            self._released.discard(session_id)
+        if entry is not None:
+            self._release(entry[0])
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Release the caches of sessions idle past the timeout; returns how many.
+
+        The sessions themselves, and the conversations they are on, stay.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            idle = [
+                session_id
+                for session_id, (_, last_used) in self._sessions.items()
+                if now - last_used > self.idle_timeout and session_id not in self._released
+            ]
+            self._released.update(idle)
+            evicted = [self._sessions[session_id][0] for session_id in idle]
+        for manager in evicted:
+            self._release(manager)
+        return len(evicted)
+
+    def _release(self, manager: ChatHistoryManager) -> None:
+        """Drop the caches of the conversations this session opened.
+
+        Conversations another active session is on, such as the same
+        user's other tab, keep their window and summary.
+        """
+        with self._lock:
+            in_use = {
+                other.current_conversation_id
+                for session_id, (other, _) in self._sessions.items()
+                if other is not manager and session_id not in self._released
+            }
+        for conversation_id in manager.conversation_ids:
+            if conversation_id in in_use:
+                continue
+            self.resources.windows.evict(conversation_id)
+            self.resources.prompt_builder.forget(conversation_id)
+
+    def _sweep(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            self.evict_idle()
+
+    def close(self) -> None:
+        """Stop the background sweeper."""
+        self._stop.set()
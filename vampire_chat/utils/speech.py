@@ -0,0 +1,249 @@
+"""
+Speech-to-text for microphone input.
+
+Audio from Gradio arrives in whatever dtype, channel layout and sample rate
+the browser recorded; ``to_mono_float32`` turns it into the 16 kHz mono
+float32 that every engine consumes. ``StreamingTranscriber`` takes the
+recording chunk by chunk while the child is still talking, detects the end
+of each utterance with a voice-activity detector and transcribes it in the
+background, so the text is (nearly) ready when recording stops.
+"""
+import json
+from collections import deque
+from concurrent.futures import Executor, Future
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from ..config.settings import (
+    STT_BACKEND,
+    STT_END_SILENCE,
+    STT_LANGUAGE,
+    STT_MODEL,
+    STT_THREADS,
+    STT_VOSK_MODEL,
+)
+from .executors import compute_executor
+
+# Every engine takes audio at this rate
+SAMPLE_RATE = 16_000
+
+SPEECH_BACKENDS = ("auto", "whisper", "vosk", "google")
+
+
+def to_mono_float32(samples: np.ndarray, sample_rate: int, target_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Convert audio of any dtype and channel layout to mono float32 at ``target_rate``.
+
+    Integer samples are scaled to [-1, 1] by their dtype's range (unsigned
+    ones re-centred first), channels (the last axis, as Gradio delivers
+    them) are averaged, and the rate is changed by linear interpolation,
+    after a moving-average low-pass when downsampling.
+    """
+    audio = np.asarray(samples)
+    if audio.dtype.kind == "u":
+        info = np.iinfo(audio.dtype)
+        audio = (audio.astype(np.float32) - (info.max + 1) / 2) / ((info.max + 1) / 2)
+    elif audio.dtype.kind == "i":
+        audio = audio.astype(np.float32) / -float(np.iinfo(audio.dtype).min)
+    else:
+        audio = audio.astype(np.float32, copy=False)
+    if audio.ndim > 1:
+        audio = audio.mean(axis=-1, dtype=np.float32)
+
+    if sample_rate != target_rate and len(audio):
+        ratio = sample_rate / target_rate
+        if ratio > 1.5:
+            width = int(round(ratio))
+            audio = np.convolve(audio, np.full(width, 1.0 / width, dtype=np.float32), mode="same")
+        count = int(round(len(audio) / ratio))
+        positions = np.arange(count, dtype=np.float64) * ratio
+        audio = np.interp(positions, np.arange(len(audio)), audio).astype(np.float32)
+    return np.clip(audio, -1.0, 1.0)
+
+
+def to_pcm16(audio: np.ndarray) -> np.ndarray:
+    """Float audio in [-1, 1] as 16-bit PCM samples."""
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+class WhisperEngine:
+    """Local CPU transcription with faster-whisper (CTranslate2, int8 weights)."""
+
+    def __init__(self, model_size: str = STT_MODEL, threads: int = STT_THREADS, language: str = STT_LANGUAGE):
+        from faster_whisper import WhisperModel
+
+        self.language = language.split("-")[0]
+        self.model = WhisperModel(model_size, device="cpu", compute_type="int8", cpu_threads=threads)
+
+    def transcribe(self, audio: np.ndarray) -> str:
+        # Utterances are already cut by our own VAD; greedy decoding keeps
+        # latency down for short children's questions
+        segments, _ = self.model.transcribe(audio, language=self.language, beam_size=1, vad_filter=False)
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+
+class VoskEngine:
+    """Local CPU transcription with a Vosk (Kaldi) model directory."""
+
+    def __init__(self, model_path: str = STT_VOSK_MODEL):
+        from vosk import KaldiRecognizer, Model
+
+        if not model_path:
+            raise ValueError("The vosk speech backend needs STT_VOSK_MODEL set to a model directory")
+        self._recognizer = KaldiRecognizer
+        self.model = Model(model_path)
+
+    def transcribe(self, audio: np.ndarray) -> str:
+        recognizer = self._recognizer(self.model, SAMPLE_RATE)
+        recognizer.AcceptWaveform(to_pcm16(audio).tobytes())
+        return json.loads(recognizer.FinalResult()).get("text", "")
+
+
+class GoogleEngine:
+    """Google Web Speech API through speech_recognition (needs the network)."""
+
+    def __init__(self, language: str = STT_LANGUAGE):
+        import speech_recognition as sr
+
+        self._sr = sr
+        self.language = language
+        self.recognizer = sr.Recognizer()
+
+    def transcribe(self, audio: np.ndarray) -> str:
+        data = self._sr.AudioData(to_pcm16(audio).tobytes(), SAMPLE_RATE, 2)
+        try:
+            return self.recognizer.recognize_google(data, language=self.language)
+        except self._sr.UnknownValueError:
+            return ""
+
+
+def create_speech_engine(backend: str = STT_BACKEND):
+    """Build the configured engine; ``auto`` prefers a local model when installed."""
+    if backend == "auto":
+        try:
+            return WhisperEngine()
+        except ImportError:
+            backend = "google"
+    if backend == "whisper":
+        return WhisperEngine()
+    if backend == "vosk":
+        return VoskEngine()
+    if backend == "google":
+        return GoogleEngine()
+    raise ValueError(f"Unknown speech backend {backend!r}, expected one of {SPEECH_BACKENDS}")
+
+
+class EnergyVAD:
+    """Frame-level voice activity from RMS energy over an adaptive noise floor.
+
+    A frame is speech when its RMS exceeds both ``min_rms`` and ``ratio``
+    times the noise floor, an exponential average (``adapt`` per frame) of
+    the energy of non-speech frames.
+    """
+
+    def __init__(self, ratio: float = 3.0, min_rms: float = 0.01, adapt: float = 0.05):
+        self.ratio = ratio
+        self.min_rms = min_rms
+        self.adapt = adapt
+        self.noise_floor: Optional[float] = None
+
+    def __call__(self, frames: np.ndarray) -> np.ndarray:
+        """Classify a ``(n_frames, frame_length)`` block; True marks speech."""
+        rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+        speech = rms > max(self.min_rms, self.ratio * (self.noise_floor or 0.0))
+        quiet = rms[~speech]
+        if len(quiet):
+            level = float(quiet.mean())
+            if self.noise_floor is None:
+                self.noise_floor = level
+            else:
+                self.noise_floor += (1.0 - (1.0 - self.adapt) ** len(quiet)) * (level - self.noise_floor)
+        return speech
+
+
+class StreamingTranscriber:
+    """Transcribes a microphone stream one utterance at a time, as it arrives.
+
+    ``feed`` takes chunks as Gradio streams them. Audio is cut into 30 ms
+    frames and classified by the VAD; an utterance starts at the first
+    speech frame (plus ``preroll`` seconds before it, so the first syllable
+    is kept) and ends after ``end_silence`` seconds without speech, at which
+    point it is passed to ``transcribe`` (usually an engine's ``transcribe``)
+    on ``executor``. ``finish`` closes any open utterance and returns the
+    whole transcript.
+    """
+
+    frame_length = SAMPLE_RATE * 30 // 1000
+
+    def __init__(
+        self,
+        transcribe: Callable[[np.ndarray], str],
+        end_silence: float = STT_END_SILENCE,
+        preroll: float = 0.3,
+        min_speech: float = 0.15,
+        vad: Optional[EnergyVAD] = None,
+        executor: Executor = compute_executor,
+    ):
+        self.transcribe = transcribe
+        self.vad = vad or EnergyVAD()
+        self.executor = executor
+        self.end_frames = max(1, int(end_silence * SAMPLE_RATE / self.frame_length))
+        self.min_speech_frames = max(1, int(min_speech * SAMPLE_RATE / self.frame_length))
+        self._tail = np.empty(0, dtype=np.float32)
+        self._preroll: deque = deque(maxlen=max(1, int(preroll * SAMPLE_RATE / self.frame_length)))
+        self._utterance: List[np.ndarray] = []
+        self._speech_frames = 0
+        self._silent_frames = 0
+        self._results: List[Future] = []
+
+    @property
+    def in_speech(self) -> bool:
+        return bool(self._utterance)
+
+    def feed(self, sample_rate: int, samples: np.ndarray) -> None:
+        """Add a chunk of the recording."""
+        audio = np.concatenate([self._tail, to_mono_float32(samples, sample_rate)])
+        count = len(audio) // self.frame_length
+        self._tail = audio[count * self.frame_length:]
+        if not count:
+            return
+        frames = audio[:count * self.frame_length].reshape(count, self.frame_length)
+
+        for frame, is_speech in zip(frames, self.vad(frames)):
+            if not self._utterance:
+                if is_speech:
+                    self._utterance = list(self._preroll) + [frame]
+                    self._preroll.clear()
+                    self._speech_frames, self._silent_frames = 1, 0
+                else:
+                    self._preroll.append(frame)
+                continue
+            self._utterance.append(frame)
+            if is_speech:
+                self._speech_frames += 1
+                self._silent_frames = 0
+            else:
+                self._silent_frames += 1
+                if self._silent_frames >= self.end_frames:
+                    self._end_utterance()
+
+    def _end_utterance(self) -> None:
+        if self._speech_frames >= self.min_speech_frames:
+            audio = np.concatenate(self._utterance)
+            self._results.append(self.executor.submit(self.transcribe, audio))
+        self._utterance = []
+        self._speech_frames = self._silent_frames = 0
+
+    def finish(self) -> str:
+        """Close the recording and return the transcript of every utterance.
+
+        Utterances that ended while recording were transcribed meanwhile,
+        so this usually only waits for the last one.
+        """
+        if self._utterance:
+            self._utterance.append(self._tail)
+            self._end_utterance()
+        self._tail = np.empty(0, dtype=np.float32)
+        texts = [future.result() for future in self._results]
+        self._results = []
+        return " ".join(text for text in texts if text).strip()
@@ -0,0 +1,81 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Tuple
+
+from .timing import latency
+
+
+class Startup:
+    """Named initialisation phases run concurrently on background threads.
+
+    Phases are registered with ``add`` and kicked off together by
+    ``start``; anything that needs a phase's result waits for it with
+    ``get``/``get_async`` (which also start a phase nobody started yet).
+    That lets the UI come up while models and indexes are still loading,
+    with requests gated on just the phases they need. Every phase's wall
+    time is recorded as ``startup_<name>`` in the latency recorder.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="startup")
+        self._registry: Dict[str, Tuple[Callable, tuple, dict]] = {}
+        self._phases: Dict[str, Future] = {}
+        self._timings: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, func: Callable, *args, **kwargs) -> None:
+        """Register a phase without starting it."""
+        with self._lock:
+            self._registry[name] = (func, args, kwargs)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time the body of a ``with`` block as a startup phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._timings[name] = seconds
+        latency.record(f"startup_{name}", seconds)
+        print(f"Startup: {name} took {seconds:.2f}s")
+
+    def _run(self, name: str) -> Any:
+        func, args, kwargs = self._registry[name]
+        with self.phase(name):
+            return func(*args, **kwargs)
+
+    def start(self, *names: str) -> None:
+        """Start the given phases (all registered ones by default) if not running yet."""
+        with self._lock:
+            for name in names or list(self._registry):
+                if name not in self._phases:
+                    self._phases[name] = self._executor.submit(self._run, name)
+
+    def _future(self, name: str) -> Future:
+        self.start(name)
+        return self._phases[name]
+
+    def ready(self, *names: str) -> bool:
+        """Whether every given phase has finished."""
+        with self._lock:
+            return all(name in self._phases and self._phases[name].done() for name in names)
+
+    def get(self, name: str, timeout: float = None) -> Any:
+        """Block until a phase finishes and return its result (or raise its error)."""
+        return self._future(name).result(timeout)
+
+    async def get_async(self, name: str) -> Any:
+        """Await a phase without blocking the event loop."""
+        return await asyncio.wrap_future(self._future(name))
+
+    def timings(self) -> Dict[str, float]:
+        """Seconds spent in each finished phase."""
+        with self._lock:
+            return dict(self._timings)
@@ -0,0 +1,53 @@
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, Sequence
+
+
+class LatencyRecorder:
+    """Thread-safe, bounded collection of latency samples per named stage."""
+
+    def __init__(self, max_samples: int = 10_000):
+        self.max_samples = max_samples
+        self._samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=self.max_samples))
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self._samples[stage].append(seconds)
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        """Time the body of a ``with`` block as one sample of ``stage``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def percentiles(self, stage: str, quantiles: Sequence[float] = (50, 95, 99)) -> Dict[str, float]:
+        """Return count, mean and the requested percentiles (in seconds)."""
+        with self._lock:
+            samples = sorted(self._samples.get(stage, ()))
+        if not samples:
+            return {"count": 0}
+        result = {"count": len(samples), "mean": sum(samples) / len(samples)}
+        for q in quantiles:
+            rank = min(len(samples) - 1, max(0, int(round(q / 100 * (len(samples) - 1)))))
+            result[f"p{q:g}"] = samples[rank]
+        return result
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Percentiles for every stage seen so far."""
+        with self._lock:
+            stages = list(self._samples)
+        return {stage: self.percentiles(stage) for stage in stages}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+
+# Process-wide recorder shared by the app, the stores and the benchmarks
+latency = LatencyRecorder()
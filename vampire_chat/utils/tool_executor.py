@@ -0,0 +1,128 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from ..config.settings import TOOL_CACHE_SIZE, TOOL_CACHE_TTL
+from .executors import io_executor
+
+
+def normalize_arguments(arguments: Dict[str, Any]) -> str:
+    """Canonical form of tool arguments, used as the cache key.
+
+    String values are lowercased with whitespace collapsed and trailing
+    punctuation dropped, so "Bats?" and " bats" share one result.
+    """
+    def normalize(value):
+        if isinstance(value, str):
+            return " ".join(value.lower().split()).rstrip("?!.")
+        return value
+
+    return json.dumps({key: normalize(value) for key, value in arguments.items()}, sort_keys=True)
+
+
+class CachedToolExecutor:
+    """Runs the tool calls of an Assistants run concurrently, with caching.
+
+    ``tools`` maps function names to callables taking the call's JSON
+    arguments as keyword arguments and returning a string. Results are cached
+    by tool name and normalized arguments for ``ttl`` seconds, at most
+    ``max_entries`` of them (least recently used go first). Concurrent calls
+    with the same key, from one run or from many sessions, share a single
+    execution. Failures are not cached; they are reported to the model as the
+    call's output, since every tool call of a run must get an output.
+    """
+
+    def __init__(
+        self,
+        tools: Dict[str, Callable[..., str]],
+        ttl: float = TOOL_CACHE_TTL,
+        max_entries: int = TOOL_CACHE_SIZE,
+    ):
+        self.tools = tools
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+
+        # (name, normalized arguments) -> (result, expiry)
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()
+        self._in_flight: Dict[Tuple[str, str], Future] = {}
+        self._lock = threading.Lock()
+
+    def call(self, name: str, arguments: Dict[str, Any]) -> str:
+        """Run one tool, answering from the cache or an identical call in flight."""
+        tool = self.tools.get(name)
+        if tool is None:
+            raise KeyError(f"Unknown tool {name!r}")
+        key = (name, normalize_arguments(arguments))
+
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+                self.misses += 1
+            else:
+                self.shared += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            result = tool(**arguments)
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._in_flight[key]
+            self._cache[key] = (result, time.monotonic() + self.ttl)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        future.set_result(result)
+        return result
+
+    def _output(self, tool_call) -> Dict[str, str]:
+        name = tool_call.function.name
+        try:
+            output = self.call(name, json.loads(tool_call.function.arguments or "{}"))
+        except Exception as e:
+            output = f"Error: {name} failed: {e}"
+        return {"tool_call_id": tool_call.id, "output": output or ""}
+
+    def run(self, tool_calls: Sequence) -> List[Dict[str, str]]:
+        """Execute a run's tool calls concurrently; returns their outputs in order."""
+        if len(tool_calls) <= 1:
+            return [self._output(tool_call) for tool_call in tool_calls]
+        futures = [io_executor.submit(self._output, tool_call) for tool_call in tool_calls]
+        return [future.result() for future in futures]
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """Drop cached results of one tool, or of all tools."""
+        with self._lock:
+            for key in [key for key in self._cache if name is None or key[0] == name]:
+                del self._cache[key]
+
+    def stats(self) -> Dict[str, float]:
+        """Cache counters; ``shared`` counts calls that joined one in flight."""
+        with self._lock:
+            calls = self.hits + self.misses + self.shared
+            return {
+                "entries": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "shared": self.shared,
+                "hit_rate": (self.hits + self.shared) / calls if calls else 0.0,
+            }
@@ -0,0 +1,185 @@
+import atexit
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+
+from ..config.settings import (
+    WRITE_BEHIND_BATCH_SIZE,
+    WRITE_BEHIND_COMPACT_AT,
+    WRITE_BEHIND_FSYNC,
+    WRITE_BEHIND_MAX_RETRIES,
+    WRITE_BEHIND_RETRY_DELAY,
+)
+from ..database.db_manager import DatabaseManager
+from ..database.vector_store import VectorStore
+from ..database.write_journal import WriteJournal
+
+
+class WriteBehindQueue:
+    """Durable write-behind pipeline for conversations and messages.
+
+    A write is acknowledged as soon as it is in the on-disk journal and the
+    in-memory queue. A background worker then applies queued writes in
+    batches: one SQLite transaction and one embedding/indexing pass per
+    batch. Until a message is applied it is served from the queue by
+    ``pending_messages``, so a conversation always reads its own writes.
+
+    Applying a batch is idempotent (``INSERT OR IGNORE`` in SQLite, a
+    message-id check in the vector store), so the journal is replayed as a
+    whole after a crash. It is truncated whenever the queue drains and
+    rewritten without its applied records once it reaches ``compact_at``.
+
+    A failing batch is retried ``max_retries`` times, then applied record
+    by record; records that still fail are appended to a dead-letter file
+    (``<journal>.dead``, one JSON object per line) instead of holding up
+    everything queued behind them.
+    """
+
+    def __init__(
+        self,
+        db_manager: DatabaseManager,
+        vector_store: VectorStore,
+        journal_path: str = "vampire_chat/database/write_behind.journal",
+        batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+        fsync: bool = WRITE_BEHIND_FSYNC,
+        retry_delay: float = WRITE_BEHIND_RETRY_DELAY,
+        max_retries: int = WRITE_BEHIND_MAX_RETRIES,
+        compact_at: int = WRITE_BEHIND_COMPACT_AT,
+    ):
+        self.db_manager = db_manager
+        self.vector_store = vector_store
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.max_retries = max_retries
+        self.compact_at = compact_at
+        self.dead_letter_path = f"{journal_path}.dead"
+        self.journal = WriteJournal(journal_path, fsync=fsync)
+
+        # Records stay queued until they are applied, so readers see them
+        self._pending: Deque[Dict] = deque(self.journal.replay())
+        # Records queued and applied so far (in queue order), for flush
+        self._enqueued = len(self._pending)
+        self._applied = 0
+        # Newest timestamp handed out, so stamps never go backwards
+        self._last_stamp = datetime.min
+        self._cond = threading.Condition()
+        self._closing = False
+        self._worker = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
+    def _enqueue(self, record: Dict) -> None:
+        with self._cond:
+            if self._closing:
+                raise RuntimeError("write-behind queue is closed")
+            if record["kind"] == "message":
+                # Stamped under the lock, so queue order (and with it row
+                # order in the vector store) is timestamp order
+                self._last_stamp = max(datetime.now(), self._last_stamp)
+                record["message"]["timestamp"] = self._last_stamp.isoformat(" ", "microseconds")
+            self.journal.append([record])
+            self._pending.append(record)
+            self._enqueued += 1
+            self._cond.notify_all()
+
+    def create_conversation(self, conversation_id: str, user_id: Optional[str] = None) -> None:
+        """Queue the creation of a conversation, optionally owned by ``user_id``."""
+        self._enqueue({"kind": "conversation", "conversation_id": conversation_id, "user_id": user_id})
+
+    def add_message(self, message: Dict) -> None:
+        """Queue a message (with ``message_id`` and ``conversation_id`` set).
+
+        The message's ``timestamp`` is set here, as it is queued.
+        """
+        self._enqueue({"kind": "message", "message": message})
+
+    def pending_messages(self, conversation_id: str) -> List[Dict]:
+        """Messages of a conversation that are not yet applied, oldest first."""
+        with self._cond:
+            return [
+                record["message"]
+                for record in self._pending
+                if record["kind"] == "message" and record["message"]["conversation_id"] == conversation_id
+            ]
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything queued so far is applied; False on timeout.
+
+        Records queued after the call are not waited for, so a busy queue
+        that never drains does not hold up the caller.
+        """
+        with self._cond:
+            target = self._enqueued
+            return self._cond.wait_for(lambda: self._applied >= target, timeout)
+
+    def _run(self) -> None:
+        """Worker loop: apply the oldest queued records in batches."""
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closing)
+                if not self._pending:
+                    return
+                batch = [self._pending[i] for i in range(min(self.batch_size, len(self._pending)))]
+
+            for attempt in range(self.max_retries + 1):
+                try:
+                    self._apply(batch)
+                    break
+                except Exception as e:
+                    print(f"Write-behind error: {e}")
+                    if self._closing:
+                        # Left in the journal and replayed on the next start
+                        return
+                    if attempt < self.max_retries:
+                        time.sleep(self.retry_delay)
+            else:
+                self._apply_each(batch)
+
+            with self._cond:
+                for _ in batch:
+                    self._pending.popleft()
+                self._applied += len(batch)
+                if not self._pending:
+                    self.journal.truncate()
+                elif self.journal.records >= self.compact_at and self.journal.records > 2 * len(self._pending):
+                    self.journal.rewrite(list(self._pending))
+                self._cond.notify_all()
+
+    def _apply_each(self, batch: List[Dict]) -> None:
+        """Apply a batch that keeps failing one record at a time, dead-lettering failures."""
+        for record in batch:
+            try:
+                self._apply([record])
+            except Exception as e:
+                print(f"Write-behind dead letter: {e}")
+                with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"record": record, "error": repr(e), "time": time.time()}) + "\n")
+
+    def _apply(self, batch: List[Dict]) -> None:
+        conversations = {
+            record["conversation_id"]: record.get("user_id") for record in batch if record["kind"] == "conversation"
+        }
+        messages = [record["message"] for record in batch if record["kind"] == "message"]
+        self.db_manager.add_messages(messages, list(conversations), conversations)
+        # Skip messages a replayed journal already got into the index
+        unindexed = {
+            msg["message_id"]: msg for msg in messages if self.vector_store.row_for(msg["message_id"]) is None
+        }
+        self.vector_store.add_messages(list(unindexed.values()))
+
+    def close(self) -> None:
+        """Apply everything still queued, then stop the worker."""
+        with self._cond:
+            if self._closing:
+                return
+            self._closing = True
+            self._cond.notify_all()
+        self._worker.join()
+        self.journal.close()